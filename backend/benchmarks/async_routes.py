@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+A/B load test of sync versus async database access in route handlers.
+
+Serves the same authenticated-style route (look up a user, then list their
+farms) twice with uvicorn: once as a sync ``def`` on SessionLocal, which
+holds one of Starlette's threadpool slots for the whole request, and once
+as an ``async def`` on AsyncSessionLocal. Both use the engines from
+database.py and the default threadpool size. ``--db-latency-ms`` adds a
+per-query delay inside the database call to stand in for a networked
+database or a slow disk. Reports requests/s and latency percentiles per
+concurrency level.
+
+    cd backend
+    pip install aiosqlite
+    python benchmarks/async_routes.py --concurrency 50 200 500 --db-latency-ms 5
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def build_app(mode: str, database_path: str, latency_ms: float):
+    from fastapi import FastAPI
+    from sqlalchemy import Column, Float, ForeignKey, Integer, String, event, func, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.orm import declarative_base, sessionmaker
+
+    from database import create_async_db_engine, create_db_engine
+
+    Base = declarative_base()
+
+    class User(Base):
+        __tablename__ = "users"
+        id = Column(Integer, primary_key=True)
+        email = Column(String)
+
+    class Farm(Base):
+        __tablename__ = "farms"
+        id = Column(Integer, primary_key=True)
+        name = Column(String)
+        area = Column(Float)
+        owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    engine = create_db_engine(f"sqlite:///{database_path}")
+
+    def register_delay(sync_engine):
+        @event.listens_for(sync_engine, "connect")
+        def add_delay_function(dbapi_connection, connection_record):
+            # delay(x) sleeps inside the driver call, as a network round trip would
+            dbapi_connection.create_function("delay", 1, lambda value: time.sleep(latency_ms / 1000) or value)
+
+    app = FastAPI()
+
+    if mode == "sync":
+        register_delay(engine)
+        SessionLocal = sessionmaker(bind=engine)
+
+        @app.get("/farms/{user_id}")
+        def list_farms(user_id: int):
+            with SessionLocal() as db:
+                user = db.execute(select(User).where(User.id == func.delay(user_id))).scalar_one()
+                farms = db.execute(select(Farm).where(Farm.owner_id == user.id)).scalars().all()
+                return [{"id": farm.id, "name": farm.name, "area": farm.area} for farm in farms]
+    else:
+        async_engine = create_async_db_engine(engine)
+        register_delay(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine)
+
+        @app.get("/farms/{user_id}")
+        async def list_farms(user_id: int):
+            async with AsyncSessionLocal() as db:
+                user = (await db.execute(select(User).where(User.id == func.delay(user_id)))).scalar_one()
+                farms = (await db.execute(select(Farm).where(Farm.owner_id == user.id))).scalars().all()
+                return [{"id": farm.id, "name": farm.name, "area": farm.area} for farm in farms]
+
+    return app, engine, Base, User, Farm
+
+
+def seed(database_path: str, users: int):
+    _, engine, Base, User, Farm = build_app("sync", database_path, 0)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": i, "email": f"user{i}@example.com"} for i in range(1, users + 1)])
+        conn.execute(Farm.__table__.insert(), [
+            {"name": f"farm {i}-{j}", "area": 1000.0 * j, "owner_id": i}
+            for i in range(1, users + 1) for j in range(5)
+        ])
+    engine.dispose()
+
+
+async def load(base_url: str, concurrency: int, seconds: float, users: int) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def worker(worker_id: int):
+            nonlocal errors
+            request = 0
+            while time.perf_counter() < deadline:
+                request += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/farms/{(worker_id + request) % users + 1}")
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*[worker(i) for i in range(concurrency)])
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    return {"rps": len(latencies) / seconds, "p50": pick(0.5), "p99": pick(0.99), "errors": errors}
+
+
+async def wait_ready(base_url: str):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(100):
+            try:
+                await client.get("/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="async-bench-")
+    database_path = os.path.join(workdir, "bench.db")
+    seed(database_path, args.users)
+
+    # Pool large enough that connections are not the bottleneck for either variant
+    env = dict(os.environ, DB_POOL_SIZE=str(max(args.concurrency)), DB_MAX_OVERFLOW="0")
+    print(f"{'mode':<8}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in ("sync", "async"):
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve", mode, "--database", database_path,
+             "--port", str(args.port), "--db-latency-ms", str(args.db_latency_ms)],
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            asyncio.run(wait_ready(base_url))
+            for concurrency in args.concurrency:
+                result = asyncio.run(load(base_url, concurrency, args.seconds, args.users))
+                print(f"{mode:<8}{concurrency:>8}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+                      f"{result['p99']:>10.1f}{result['errors']:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--serve", choices=("sync", "async"), help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+
+        app = build_app(args.serve, args.database, args.db_latency_ms)[0]
+        uvicorn.run(app, port=args.port, log_level="warning")
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
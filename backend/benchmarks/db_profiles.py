@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write throughput of the SQLite engine profiles.
+
+Runs the same mixed workload against a fresh database file for every
+profile in database.PROFILES: writer threads insert soil readings one
+commit at a time (as registration, farm creation and single readings do)
+while reader threads page through the newest readings. Reports committed
+writes and reads per second and how many operations failed with
+"database is locked".
+
+    cd backend
+    python benchmarks/db_profiles.py --writers 8 --readers 8 --seconds 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, Table, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from database import PROFILES, create_db_engine, create_read_engine  # noqa: E402
+
+metadata = MetaData()
+readings = Table(
+    "soil_readings", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("farm_id", Integer, nullable=False),
+    Column("moisture", Float),
+    Column("recorded_at", DateTime, nullable=False),
+    Index("ix_bench_farm_recorded", "farm_id", "recorded_at", "id"),
+)
+
+
+def run_profile(profile: str, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"db_{profile}_")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_db_engine(url, profile)
+    read_engine = create_read_engine(engine, profile)
+    metadata.create_all(engine)
+
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(worker: int):
+        while time.monotonic() < deadline:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(readings.insert().values(
+                        farm_id=worker % args.farms, moisture=40.0, recorded_at=datetime.utcnow()
+                    ))
+                bump("writes")
+            except OperationalError:
+                bump("locked")
+
+    def reader(worker: int):
+        stmt = select(readings).where(readings.c.farm_id == worker % args.farms) \
+            .order_by(readings.c.recorded_at.desc(), readings.c.id.desc()).limit(100)
+        while time.monotonic() < deadline:
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(stmt).fetchall()
+                bump("reads")
+            except OperationalError:
+                bump("locked")
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    read_engine.dispose()
+    return {key: value / args.seconds if key != "locked" else value for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--farms", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:.0f}s per profile")
+    print(f"{'profile':<12}{'writes/s':>12}{'reads/s':>12}{'locked':>10}")
+    for profile in PROFILES:
+        result = run_profile(profile, args)
+        print(f"{profile:<12}{result['writes']:>12.0f}{result['reads']:>12.0f}{result['locked']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Leaf triage hit rate and error rate on labelled photos.
+
+Point it at a directory with one subdirectory per label, e.g. healthy/ and
+diseased/ (any name other than "healthy" counts as not healthy). Every photo
+goes through prepare_image exactly as an upload would. The report shows, for
+each threshold, the share of photos answered locally (Gemini calls saved),
+the share of healthy photos caught, and the diseased photos wrongly passed
+as healthy, which should stay at zero.
+
+    cd backend
+    python benchmarks/leaf_triage.py ~/field-photos --thresholds 0.75 0.85 0.95
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from image_pipeline import prepare_image  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_scores(directory: str):
+    scores = []  # (label is healthy, healthy_score)
+    prepare_seconds = 0.0
+    for label in sorted(os.listdir(directory)):
+        label_dir = os.path.join(directory, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            started = time.perf_counter()
+            prepared = prepare_image(os.path.join(label_dir, name))
+            prepare_seconds += time.perf_counter() - started
+            scores.append((label == "healthy", prepared.leaf.healthy_score))
+    return scores, prepare_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.75, 0.85, 0.95])
+    args = parser.parse_args()
+
+    scores, prepare_seconds = load_scores(args.directory)
+    if not scores:
+        sys.exit(f"No labelled photos under {args.directory}")
+    healthy = sum(1 for is_healthy, _ in scores if is_healthy)
+    print(f"{len(scores)} photos ({healthy} healthy), {prepare_seconds / len(scores) * 1000:.1f} ms per prepare")
+    print(f"{'threshold':>10}{'local':>8}{'healthy caught':>16}{'false healthy':>15}")
+    for threshold in args.thresholds:
+        passed = [is_healthy for is_healthy, score in scores if score >= threshold]
+        caught = sum(passed)
+        false_healthy = len(passed) - caught
+        print(
+            f"{threshold:>10.2f}{len(passed) / len(scores):>8.1%}"
+            f"{(caught / healthy if healthy else 0):>16.1%}{false_healthy:>15}"
+        )
+
+
+if __name__ == "__main__":
+    main()
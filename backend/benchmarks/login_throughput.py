@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Password verifications per second through the hashing pool.
+
+Drives PasswordHasher.verify with a burst of concurrent logins for each
+worker count and iteration setting, and reports logins/s overall and per
+worker process (one worker per core), plus how many logins were shed with
+HashingBusy at the configured queue depth.
+
+    cd backend
+    python benchmarks/login_throughput.py --workers 1 2 4 --iterations 100000 310000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from password_hashing import HashingBusy, PasswordHasher, hash_password  # noqa: E402
+
+
+async def measure(workers: int, iterations: int, logins: int, max_pending: int) -> dict:
+    hasher = PasswordHasher(iterations=iterations, max_workers=workers, max_pending=max_pending)
+    stored = hash_password("correct horse", iterations)
+    await hasher.verify("correct horse", stored)  # start the worker processes
+
+    shed = 0
+
+    async def login():
+        nonlocal shed
+        try:
+            await hasher.verify("correct horse", stored)
+        except HashingBusy:
+            shed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    completed = logins - shed
+    return {"rate": completed / elapsed, "per_core": completed / elapsed / workers, "shed": shed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--iterations", type=int, nargs="+", default=[100000])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--max-pending", type=int, default=10000, help="queue depth before logins are shed")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.logins} concurrent logins per run")
+    print(f"{'iterations':>11}{'workers':>9}{'logins/s':>11}{'per core':>10}{'shed':>7}")
+    for iterations in args.iterations:
+        for workers in args.workers:
+            result = asyncio.run(measure(workers, iterations, args.logins, args.max_pending))
+            print(f"{iterations:>11}{workers:>9}{result['rate']:>11.1f}{result['per_core']:>10.1f}{result['shed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Farm NDVI latency and memory on a large scene.
+
+Writes a Sentinel-2 sized synthetic scene (10980 x 10980 uint16 per band,
+~240 MB each) unless --scene points at an existing one, then computes NDVI
+for random farm-sized circles through the windowed readers and reports
+latency and the growth in peak RSS. --full-read finishes with a whole-band
+read for comparison. Generating the scene inflates the process's peak RSS,
+so measure memory in a second run with --scene.
+
+    cd backend
+    python benchmarks/ndvi_windows.py --farms 200 --full-read
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+
+from ndvi import circle_polygon, open_scene, scene_ndvi, write_synthetic_scene  # noqa: E402
+
+BOUNDS = (80.0, 7.0, 81.0, 8.0)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scene", help="existing scene directory (red/nir GeoTIFFs)")
+    parser.add_argument("--size", type=int, default=10980)
+    parser.add_argument("--uncompressed", action="store_true", help="memory-mappable rasters instead of tiled zlib")
+    parser.add_argument("--farms", type=int, default=100)
+    parser.add_argument("--radius", type=float, default=150, help="farm radius in metres")
+    parser.add_argument("--full-read", action="store_true")
+    args = parser.parse_args()
+
+    directory = args.scene
+    if directory is None:
+        directory = os.path.join(tempfile.mkdtemp(), "scene")
+        print(f"Writing {args.size}x{args.size} synthetic scene to {directory} ...")
+        write_synthetic_scene(
+            directory, BOUNDS, size=(args.size, args.size),
+            tile=None if args.uncompressed else 256, compression=None if args.uncompressed else "zlib",
+        )
+
+    scene = open_scene(directory)
+    left, bottom, right, top = scene.bounds
+    print(f"Scene {scene.scene_id}: {scene.red.shape[1]}x{scene.red.shape[0]} px, reader {type(scene.red).__name__}")
+
+    rng = random.Random(1)
+    baseline = peak_rss_mb()
+    latencies = []
+    for _ in range(args.farms):
+        lat, lng = rng.uniform(bottom + 0.01, top - 0.01), rng.uniform(left + 0.01, right - 0.01)
+        started = time.perf_counter()
+        scene_ndvi(scene, circle_polygon(lat, lng, args.radius))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(
+        f"{args.farms} farms: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, "
+        f"peak RSS +{peak_rss_mb() - baseline:.0f} MB"
+    )
+
+    if args.full_read:
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        height, width = scene.red.shape
+        red = scene.red.read(0, height, 0, width).astype(np.float32)
+        nir = scene.nir.read(0, height, 0, width).astype(np.float32)
+        float(((nir - red) / np.maximum(nir + red, 1)).mean())
+        print(f"Whole-band read: {time.perf_counter() - started:.2f} s, peak RSS +{peak_rss_mb() - baseline:.0f} MB")
+    scene.close()
+
+
+if __name__ == "__main__":
+    main()
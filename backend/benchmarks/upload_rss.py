@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the backend under concurrent disease-detection uploads.
+
+Starts the API with uvicorn in a scratch directory, fires N concurrent
+uploads of a large synthetic camera photo and samples the resident set size
+of the server process plus its children (the image worker pool) from /proc.
+Linux only.
+
+    cd backend
+    python benchmarks/upload_rss.py --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import httpx
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """A noisy JPEG, so it compresses about as badly as a real field photo."""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    buffered = BytesIO()
+    Image.fromarray(pixels).save(buffered, format="JPEG", quality=95)
+    return buffered.getvalue()
+
+
+def process_tree_rss(pid: int) -> int:
+    """RSS in bytes of a process and all of its descendants."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+async def run(args):
+    photo = make_photo(args.width, args.height)
+    print(f"Upload size: {len(photo) / 1e6:.1f} MB, concurrency: {args.concurrency}")
+
+    workdir = tempfile.mkdtemp(prefix="upload-bench-")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, GEMINI_API_KEY="")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            # Warm the worker pool so its start-up cost is in the baseline
+            await client.post("/api/disease-detection", files={"file": ("warm.jpg", photo, "image/jpeg")})
+            baseline = process_tree_rss(server.pid)
+
+            peak = baseline
+            done = asyncio.Event()
+
+            async def sample():
+                nonlocal peak
+                while not done.is_set():
+                    peak = max(peak, process_tree_rss(server.pid))
+                    await asyncio.sleep(0.01)
+
+            sampler = asyncio.create_task(sample())
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post("/api/disease-detection", files={"file": (f"leaf{i}.jpg", photo, "image/jpeg")})
+                for i in range(args.concurrency)
+            ])
+            elapsed = time.perf_counter() - started
+            done.set()
+            await sampler
+    finally:
+        server.terminate()
+        server.wait()
+
+    failures = sum(1 for response in responses if response.status_code != 200)
+    print(f"Completed {len(responses)} uploads in {elapsed:.2f}s ({failures} failed)")
+    print(f"Baseline RSS: {baseline / 1e6:.1f} MB")
+    print(f"Peak RSS:     {peak / 1e6:.1f} MB")
+    print(f"Per upload:   {(peak - baseline) / args.concurrency / 1e6:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
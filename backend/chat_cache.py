@@ -0,0 +1,170 @@
+"""
+Answer cache for the agricultural chatbot.
+
+Questions are normalized per language (Unicode case folding, punctuation
+and whitespace collapsed, stopwords dropped) and keyed on the resulting bag
+of words, so "How do I grow rice?" and "how to grow rice" share an entry.
+Questions that differ by a word or two are matched through a small TF-IDF
+index over the cached questions: cosine scores are accumulated over the
+posting lists of the query's terms and the best candidate is returned when
+it clears ``similarity``. Entry weights use the IDF at insertion time, so
+lookups never rescore the whole cache.
+
+Entries expire after ``ttl_seconds`` and the least recently used ones are
+evicted beyond ``max_entries``.
+"""
+
+import math
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set
+
+LANGUAGES = ("en", "si", "ta")
+
+# Interrogatives (how, what, when, where, why, which) stay in the key:
+# "when to plant rice" and "how to plant rice" need different answers.
+STOPWORDS: Dict[str, Set[str]] = {
+    "en": {
+        "a", "about", "an", "and", "are", "as", "at", "be", "can", "could", "do", "does", "for", "from",
+        "get", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please", "should", "tell", "that",
+        "the", "there", "this", "to", "will", "with", "would", "you", "your",
+    },
+    "si": {
+        "මට", "මගේ", "මම", "ඔබ", "ඔයා", "මේ", "ඒ", "එක", "සහ", "හා", "ද", "දැ", "ගැන", "කියන්න",
+        "වල", "නම්", "තියෙන්නේ", "කරන්නේ", "කරන්න", "පුළුවන්ද", "ඕනේ",
+    },
+    "ta": {
+        "ஒரு", "இந்த", "அந்த", "மற்றும்", "எனக்கு", "என்", "நான்", "நீங்கள்", "பற்றி", "உள்ள", "ஆகும்", "இது", "அது", "சொல்லுங்கள்", "வேண்டும்", "செய்வது",
+        "முடியுமா",
+    },
+}
+
+_SCRIPTS = (("si", 0x0D80, 0x0DFF), ("ta", 0x0B80, 0x0BFF))
+
+
+def detect_language(text: str) -> str:
+    """Sinhala or Tamil if the text uses that script, otherwise English."""
+    for char in text:
+        code = ord(char)
+        for language, start, end in _SCRIPTS:
+            if start <= code <= end:
+                return language
+    return "en"
+
+
+def _is_separator(char: str) -> bool:
+    # Punctuation, symbols, spaces and control characters split words. Format
+    # characters (ZWJ/ZWNJ in Sinhala conjuncts) and combining vowel signs stay.
+    category = unicodedata.category(char)
+    return category[0] in "PSZ" or category == "Cc"
+
+
+def tokenize(text: str, language: str) -> List[str]:
+    folded = unicodedata.normalize("NFKC", text).casefold()
+    words = "".join(" " if _is_separator(char) else char for char in folded).split()
+    stopwords = STOPWORDS.get(language, STOPWORDS["en"])
+    return [word for word in words if word not in stopwords]
+
+
+class ChatAnswerCache:
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 5000, similarity: float = 0.85):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # key -> (expires_at, answer, term weights, weight norm)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}  # "lang:term" -> keys containing it
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(language: str, terms: Counter) -> str:
+        return f"{language}:" + " ".join(sorted(terms))
+
+    def _idf(self, posting_key: str) -> float:
+        documents = len(self._entries)
+        return math.log((documents + 1) / (len(self._postings.get(posting_key, ())) + 1)) + 1
+
+    def _vector(self, language: str, terms: Counter):
+        weights = {term: count * self._idf(f"{language}:{term}") for term, count in terms.items()}
+        return weights, math.sqrt(sum(weight * weight for weight in weights.values()))
+
+    def _nearest(self, language: str, terms: Counter) -> Optional[str]:
+        query, query_norm = self._vector(language, terms)
+        dots: Dict[str, float] = {}
+        for term, weight in query.items():
+            for key in self._postings.get(f"{language}:{term}", ()):
+                dots[key] = dots.get(key, 0.0) + weight * self._entries[key][2][term]
+
+        best_key, best_score = None, self.similarity
+        for key, dot in dots.items():
+            score = dot / (query_norm * self._entries[key][3])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _remove(self, key: str):
+        _, _, terms, _ = self._entries.pop(key)
+        language = key.split(":", 1)[0]
+        for term in terms:
+            posting_key = f"{language}:{term}"
+            keys = self._postings.get(posting_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[posting_key]
+
+    def get(self, question: str, language: Optional[str] = None) -> Optional[str]:
+        language = language if language in LANGUAGES else detect_language(question)
+        terms = Counter(tokenize(question, language))
+        if not terms:
+            return None
+
+        key = self._key(language, terms)
+        now = time.monotonic()
+        with self._lock:
+            near = key not in self._entries
+            if near:
+                key = self._nearest(language, terms)
+            if key is None or self._entries[key][0] < now:
+                if key is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if near:
+                self._near_hits += 1
+            else:
+                self._hits += 1
+            return self._entries[key][1]
+
+    def put(self, question: str, answer: str, language: Optional[str] = None):
+        language = language if language in LANGUAGES else detect_language(question)
+        terms = Counter(tokenize(question, language))
+        if not terms:
+            return
+
+        key = self._key(language, terms)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            weights, norm = self._vector(language, terms)
+            self._entries[key] = (time.monotonic() + self.ttl, answer, weights, norm)
+            for term in terms:
+                self._postings.setdefault(f"{language}:{term}", set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._near_hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self._hits,
+            "near_hits": self._near_hits,
+            "misses": self._misses,
+            "hit_rate": round((self._hits + self._near_hits) / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,78 @@
+"""
+Offline intent matching for the chatbot's keyword fallback.
+
+Intents, their keywords (English, Sinhala, Tamil) and canned responses live
+in chat_intents.json. At load time every keyword is compiled into a single
+alternation regex, longest first, so a message is matched in one pass no
+matter how many intents there are. English keywords match at the start of
+a word, so inflections count ("watering", "pesticides", "diseased") but
+"rice" does not match inside "price"; Sinhala and Tamil keywords match
+anywhere, since suffixes attach directly to the stem.
+
+Intents are ranked by how many distinct keywords they matched, with ties
+going to the intent listed first in the file.
+"""
+
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    response: str
+
+
+class IntentMatcher:
+    def __init__(self, intents: List[Intent], keywords: Dict[str, List[int]], default: str):
+        self.intents = intents
+        self.default = default
+        self._keywords = keywords  # normalized keyword -> indices of intents using it
+
+        ascii_words = sorted((word for word in keywords if word.isascii()), key=len, reverse=True)
+        other_words = sorted((word for word in keywords if not word.isascii()), key=len, reverse=True)
+        alternatives = []
+        if ascii_words:
+            alternatives.append(r"\b(?P<word>" + "|".join(map(re.escape, ascii_words)) + r")\w*")
+        if other_words:
+            alternatives.append("(?P<stem>" + "|".join(map(re.escape, other_words)) + ")")
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    @classmethod
+    def load(cls, path: str) -> "IntentMatcher":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        intents: List[Intent] = []
+        keywords: Dict[str, List[int]] = {}
+        for index, entry in enumerate(data["intents"]):
+            intents.append(Intent(name=entry["name"], response=entry["response"]))
+            for words in entry["keywords"].values():
+                for word in words:
+                    indices = keywords.setdefault(normalize(word), [])
+                    if index not in indices:
+                        indices.append(index)
+        return cls(intents, keywords, data["default"])
+
+    def match(self, message: str) -> List[Tuple[Intent, int]]:
+        """Matched intents with their number of distinct keyword hits, best first."""
+        if self._pattern is None:
+            return []
+        hits: Dict[int, set] = {}
+        for found in self._pattern.finditer(normalize(message)):
+            keyword = found.group(found.lastgroup)
+            for index in self._keywords[keyword]:
+                hits.setdefault(index, set()).add(keyword)
+        ranked = sorted(hits.items(), key=lambda item: (-len(item[1]), item[0]))
+        return [(self.intents[index], len(words)) for index, words in ranked]
+
+    def respond(self, message: str) -> str:
+        matches = self.match(message)
+        return matches[0][0].response if matches else self.default
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
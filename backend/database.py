@@ -0,0 +1,136 @@
+"""
+Database engine configuration.
+
+The URL comes from DATABASE_URL (or SQLALCHEMY_DATABASE_URL) and defaults to
+the local SQLite file, so switching to Postgres is an environment change.
+For SQLite, DB_PROFILE selects the connection tuning:
+
+- ``production`` (default): WAL journal, synchronous=NORMAL, memory-mapped
+  I/O, a larger page cache and a busy timeout, plus a separate read-only
+  connection pool so reads never queue behind the writer.
+- ``legacy``: the original rollback-journal defaults, kept for comparison.
+
+Async engines for the request handlers are derived from the sync ones, using
+aiosqlite for SQLite and asyncpg for Postgres, with the same pragmas and
+pool sizing.
+"""
+
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+DB_PATH = os.path.abspath("plantation.db")
+DEFAULT_DATABASE_URL = f"sqlite:///{DB_PATH}"
+
+PROFILES = ("production", "legacy")
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def database_url() -> str:
+    return os.getenv("DATABASE_URL") or os.getenv("SQLALCHEMY_DATABASE_URL") or DEFAULT_DATABASE_URL
+
+
+def sqlite_pragmas(profile: str) -> dict:
+    if profile == "legacy":
+        return {}
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_MB", "256")) * 1024 * 1024,
+        "cache_size": -int(os.getenv("SQLITE_CACHE_MB", "64")) * 1024,  # negative = KiB
+        "temp_store": "MEMORY",
+    }
+
+
+def _pool_args(url) -> dict:
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # in-memory databases use a single shared connection
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": url.get_backend_name() != "sqlite",
+    }
+
+
+def _apply_pragmas(engine: Engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None, profile: Optional[str] = None) -> Engine:
+    url = make_url(url or database_url())
+    profile = profile or os.getenv("DB_PROFILE", "production")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}, expected one of {PROFILES}")
+
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, echo=False, pool_recycle=1800, **_pool_args(url))
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        echo=False,  # Set to True for SQL debugging
+        **(_pool_args(url) if profile != "legacy" else {})
+    )
+    _apply_pragmas(engine, sqlite_pragmas(profile))
+    return engine
+
+
+def create_read_engine(engine: Engine, profile: Optional[str] = None) -> Engine:
+    """Engine for read-only work: DATABASE_READ_URL (e.g. a Postgres replica) if
+    set, a read-only SQLite connection pool in the production profile, and
+    otherwise the primary engine itself."""
+    read_url = os.getenv("DATABASE_READ_URL")
+    if read_url:
+        return create_engine(read_url, echo=False, pool_recycle=1800, **_pool_args(make_url(read_url)))
+
+    profile = profile or os.getenv("DB_PROFILE", "production")
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or profile == "legacy" or url.database in (None, "", ":memory:"):
+        return engine
+
+    read_only_url = url.set(database=f"file:{url.database}?mode=ro", query={"uri": "true"})
+    read_engine = create_engine(
+        read_only_url,
+        connect_args={"check_same_thread": False},
+        echo=False,
+        **_pool_args(url)
+    )
+    pragmas = {name: value for name, value in sqlite_pragmas(profile).items() if name != "journal_mode"}
+    _apply_pragmas(read_engine, pragmas)
+    return read_engine
+
+
+def create_async_db_engine(engine: Engine, profile: Optional[str] = None) -> AsyncEngine:
+    """Async counterpart of ``engine``: same database, pragmas and pool sizing."""
+    profile = profile or os.getenv("DB_PROFILE", "production")
+    url = engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    async_url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+    if backend != "sqlite":
+        return create_async_engine(async_url, echo=False, pool_recycle=1800, **_pool_args(url))
+
+    pool_args = _pool_args(url) if profile != "legacy" else {}
+    if pool_args:
+        pool_args["poolclass"] = AsyncAdaptedQueuePool
+    async_engine = create_async_engine(async_url, echo=False, **pool_args)
+
+    pragmas = sqlite_pragmas(profile)
+    if url.query.get("mode") == "ro" or "mode=ro" in (url.database or ""):
+        pragmas.pop("journal_mode", None)  # read-only connections cannot change it
+    _apply_pragmas(async_engine.sync_engine, pragmas)
+    return async_engine
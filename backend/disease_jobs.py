@@ -0,0 +1,231 @@
+"""
+Persistent job queue for asynchronous disease analysis.
+
+Jobs are rows in the main database, so a restart picks up where it left off.
+A fixed number of asyncio workers claim queued rows and run the analysis
+handler; clients poll the job or subscribe to its Server-Sent Events stream.
+A claim records the claiming process and time. A job still running after
+``lease`` seconds belongs to a process that died and can be claimed again,
+by any server process; younger claims are never touched, so several
+processes can share the queue.
+A job that fails with a transient error (a timeout, a dropped connection, a
+locked database, a crashed worker pool) is requeued up to ``max_attempts``
+times; any other failure, such as an undecodable image, fails it at once.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ("done", "failed")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, OperationalError, BrokenProcessPool))
+
+
+def job_to_dict(job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+class DiseaseJobQueue:
+    def __init__(
+        self,
+        session_factory,
+        model,
+        handler: Callable[[object], Awaitable[dict]],
+        workers: int = 4,
+        max_pending: int = 200,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        retention: timedelta = timedelta(days=1),
+        retryable: Callable[[BaseException], bool] = is_retryable,
+        lease: float = 300,
+    ):
+        self.session_factory = session_factory
+        self.model = model
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.retryable = retryable
+        self.lease = timedelta(seconds=lease)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._recover)
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Disease job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _recover(self):
+        """Prune old finished jobs. Jobs left running by a dead process are
+        claimed again once their lease expires (see ``_claimable``)."""
+        model = self.model
+        with self.session_factory() as db:
+            db.execute(
+                delete(model).where(model.status.in_(FINISHED_STATES), model.updated_at < datetime.utcnow() - self.retention),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
+
+    # Submission and lookup
+
+    async def submit(self, **fields) -> dict:
+        job = await asyncio.to_thread(self._insert, fields)
+        self._wakeup.set()
+        return job
+
+    def _insert(self, fields: dict) -> dict:
+        model = self.model
+        with self.session_factory() as db:
+            pending = db.scalar(select(func.count()).select_from(model).where(model.status == "queued"))
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs already queued")
+
+            now = datetime.utcnow()
+            job = model(id=uuid.uuid4().hex, status="queued", attempts=0, created_at=now, updated_at=now, **fields)
+            db.add(job)
+            db.commit()
+            return job_to_dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.session_factory() as db:
+            job = db.get(self.model, job_id)
+            return job_to_dict(job) if job is not None else None
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """Return when a local worker finishes the job, or after ``timeout``."""
+        event = asyncio.Event()
+        waiters = self._listeners.setdefault(job_id, set())
+        waiters.add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters.discard(event)
+            if not waiters and self._listeners.get(job_id) is waiters:
+                del self._listeners[job_id]
+
+    def _notify(self, job_id: str):
+        for event in self._listeners.pop(job_id, ()):
+            event.set()
+
+    # Workers
+
+    async def _worker(self, number: int):
+        while True:
+            # Cleared before claiming so a submit that lands mid-claim still wakes us
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Disease job worker {number} failed to claim a job: {e}")
+                job = None
+
+            if job is not None and job.attempts > self.max_attempts:
+                # Its process died mid-run on every attempt
+                await asyncio.to_thread(self._finish, job.id, "failed", None, f"Abandoned after {self.max_attempts} attempts")
+                self._notify(job.id)
+                continue
+
+            if job is None:
+                # Idle; jobs submitted by other processes are picked up on the next poll
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Disease job {job.id} failed: {e}")
+                failed = not self.retryable(e) or job.attempts >= self.max_attempts
+                await asyncio.to_thread(self._finish, job.id, "failed" if failed else "queued", None, str(e))
+                if not failed:
+                    continue
+            else:
+                await asyncio.to_thread(self._finish, job.id, "done", json.dumps(result), None)
+            self._notify(job.id)
+
+    def _claimable(self):
+        model = self.model
+        expired = or_(model.claimed_at.is_(None), model.claimed_at < datetime.utcnow() - self.lease)
+        return or_(model.status == "queued", and_(model.status == "running", expired))
+
+    def _claim(self):
+        """Atomically move the oldest queued (or abandoned) job to running and return it."""
+        model = self.model
+        with self.session_factory() as db:
+            while True:
+                job_id = db.scalar(
+                    select(model.id).where(self._claimable()).order_by(model.created_at).limit(1)
+                )
+                if job_id is None:
+                    return None
+
+                now = datetime.utcnow()
+                claimed = db.execute(
+                    update(model)
+                    .where(model.id == job_id, self._claimable())
+                    .values(status="running", attempts=model.attempts + 1, owner=self.owner, claimed_at=now, updated_at=now),
+                    execution_options={"synchronize_session": False},
+                ).rowcount
+                db.commit()
+                if claimed:
+                    job = db.get(self.model, job_id)
+                    db.expunge(job)
+                    return job
+                # Another worker won the race; try the next one
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        model = self.model
+        with self.session_factory() as db:
+            # Only while we still hold the claim; after a lapsed lease the new owner finishes it
+            db.execute(
+                update(model).where(model.id == job_id, model.owner == self.owner).values(
+                    status=status, result=result, error=error, updated_at=datetime.utcnow()
+                ),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
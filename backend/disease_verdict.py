@@ -0,0 +1,49 @@
+"""
+Prompt, response schema and parser for Gemini's crop disease verdict.
+
+Shared by the backend and the Cloud Function: functions/disease_verdict.py is
+an identical copy (the function is deployed from its own directory), and
+test_system.py checks that the two files match.
+"""
+
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# Gemini answers in JSON matching this schema; the token cap in the
+# generation config keeps replies to the four fields instead of an essay
+DISEASE_PROMPT = (
+    "Diagnose this crop photo. status: healthy or diseased. disease: the disease or pest name, null if healthy. "
+    "confidence: 0-100. recommendation: one or two practical sentences for a farmer "
+    "(treatment if diseased, care if healthy). Consider blight, rust, powdery mildew, leaf spots, rot, wilt and pests."
+)
+
+DISEASE_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "status": {"type": "STRING", "format": "enum", "enum": ["healthy", "diseased"]},
+        "disease": {"type": "STRING", "nullable": True},
+        "confidence": {"type": "NUMBER"},
+        "recommendation": {"type": "STRING"},
+    },
+    "required": ["status", "confidence", "recommendation"],
+}
+
+
+class GeminiDiseaseVerdict(BaseModel):
+    # Shape Gemini is asked to return for a leaf photo (see DISEASE_RESPONSE_SCHEMA)
+    status: Literal["healthy", "diseased"]
+    disease: Optional[str] = None
+    confidence: float = Field(ge=0, le=100)
+    recommendation: str
+
+
+def parse_disease_verdict(text: str) -> dict:
+    """Validate Gemini's JSON verdict; raises pydantic's ValidationError (a ValueError) if it does not match."""
+    verdict = GeminiDiseaseVerdict.model_validate_json(text)
+    return {
+        "status": verdict.status,
+        "disease": verdict.disease if verdict.status == "diseased" else None,
+        "confidence": f"{round(verdict.confidence)}%",
+        "recommendation": verdict.recommendation,
+    }
@@ -0,0 +1,242 @@
+"""
+Process-wide gateway to Gemini for disease detection and the chatbot.
+
+The SDK is configured and the model built once, on first use. Every call
+waits for one of ``max_concurrency`` slots and runs under a deadline that
+covers the slot wait, all retries and their backoff, so a degraded upstream
+costs a request at most ``timeout`` seconds. Transient failures (timeouts,
+connection errors, 429 and 5xx responses) are retried with jittered
+exponential backoff while the deadline allows.
+
+A circuit breaker watches the outcome of recent calls. Once the failure
+ratio over the last ``window`` calls reaches ``threshold`` it opens and
+calls fail immediately with GeminiUnavailable, which callers answer with
+their offline fallbacks. After ``cooldown`` seconds one probe call is let
+through; its success closes the breaker again.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class GeminiUnavailable(Exception):
+    pass
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError, TimeoutError)):
+        return True
+    # google.api_core errors carry the HTTP status as ``code``
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and code in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    def __init__(self, window: int = 20, threshold: float = 0.5, min_calls: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        # A probe that never reported back (its request was cancelled) expires after a cooldown
+        if state == "half_open" and (self._probe_started is None or now - self._probe_started >= self.cooldown):
+            self._probe_started = now
+            return True
+        return False
+
+    def record(self, success: bool):
+        if self._opened_at is not None:
+            # Outcome of the half-open probe
+            self._probe_started = None
+            if success:
+                self._opened_at = None
+                self._outcomes.clear()
+            else:
+                self._opened_at = time.monotonic()
+            return
+
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+            self._opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(f"Gemini circuit opened after {failures}/{len(self._outcomes)} failed calls")
+
+
+class GeminiGateway:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model_name: str = "gemini-1.5-flash",
+        max_concurrency: int = 8,
+        timeout: float = 20.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._model = None
+
+        self._calls = 0
+        self._retries = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._rejected = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _admit(self):
+        if not self.configured:
+            raise GeminiUnavailable("GEMINI_API_KEY is not set")
+        if not self.breaker.allow():
+            self._rejected += 1
+            raise GeminiUnavailable("Gemini circuit is open")
+        try:
+            return self._get_model()
+        except Exception as e:
+            self.breaker.record(True)  # release a half-open probe; upstream was never called
+            raise GeminiUnavailable(f"Gemini SDK unavailable: {e}") from e
+
+    async def _backoff(self, attempt: int, deadline: float) -> bool:
+        """Sleep before retry ``attempt``; False if the deadline leaves no room for it."""
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if time.monotonic() + delay >= deadline:
+            return False
+        self._retries += 1
+        await asyncio.sleep(delay)
+        return True
+
+    def _fail(self, exc: BaseException) -> GeminiUnavailable:
+        # Requests Gemini rejected (bad input, blocked content) say nothing about its health
+        self.breaker.record(not is_transient(exc))
+        self._failures += 1
+        if isinstance(exc, asyncio.TimeoutError):
+            self._timeouts += 1
+            return GeminiUnavailable(f"Gemini did not answer within {self.timeout}s")
+        return GeminiUnavailable(f"Gemini call failed: {exc!r}")
+
+    def _remaining(self, deadline: float) -> float:
+        return max(deadline - time.monotonic(), 0)
+
+    async def _acquire_slot(self, deadline: float):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._remaining(deadline))
+        except asyncio.TimeoutError as e:
+            raise self._fail(e) from e
+
+    async def generate(self, contents, **kwargs):
+        """``generate_content`` with the gateway's slot limit, deadline and retries."""
+        model = self._admit()
+        self._calls += 1
+        deadline = time.monotonic() + self.timeout
+        await self._acquire_slot(deadline)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(contents, **kwargs), self._remaining(deadline)
+                    )
+                    self.breaker.record(True)
+                    return response
+                except Exception as e:
+                    if is_transient(e) and attempt < self.retries and await self._backoff(attempt, deadline):
+                        attempt += 1
+                        continue
+                    raise self._fail(e) from e
+        finally:
+            self._slots.release()
+
+    async def stream(self, contents, **kwargs) -> AsyncIterator[str]:
+        """Text chunks of a streamed answer. The first chunk must arrive within the
+        deadline (retried like ``generate``); after that each chunk gets a fresh one."""
+        model = self._admit()
+        self._calls += 1
+        deadline = time.monotonic() + self.timeout
+        await self._acquire_slot(deadline)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(contents, stream=True, **kwargs), self._remaining(deadline)
+                    )
+                    chunks = response.__aiter__()
+                    first = await asyncio.wait_for(chunks.__anext__(), self._remaining(deadline))
+                    break
+                except StopAsyncIteration:
+                    self.breaker.record(True)
+                    return
+                except Exception as e:
+                    if is_transient(e) and attempt < self.retries and await self._backoff(attempt, deadline):
+                        attempt += 1
+                        continue
+                    raise self._fail(e) from e
+
+            # Gemini is answering; a stall past this point fails the request but not the breaker
+            self.breaker.record(True)
+            yield first.text
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    self._failures += 1
+                    raise GeminiUnavailable(f"Gemini stream interrupted: {e!r}") from e
+                yield chunk.text
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.configured,
+            "model": self.model_name,
+            "circuit": self.breaker.state,
+            "circuit_trips": self.breaker.trips,
+            "calls": self._calls,
+            "retries": self._retries,
+            "failures": self._failures,
+            "timeouts": self._timeouts,
+            "rejected_open_circuit": self._rejected,
+            "timeout_seconds": self.timeout,
+        }
@@ -0,0 +1,88 @@
+"""
+Write-behind recorder for disease detection history.
+
+Detections are queued in memory and written in batched transactions every
+``batch_size`` rows or ``flush_interval`` seconds, whichever comes first, so
+the detection hot path never waits on the SQLite write lock.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryRecorder:
+    def __init__(self, session_factory, model, batch_size: int = 100, flush_interval: float = 0.5, max_queue: int = 10000):
+        self.session_factory = session_factory
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[dict] = []
+        self.dropped = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        rows, self._batch = self._batch, []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        if rows:
+            await asyncio.to_thread(self._flush, rows)
+
+    def record(self, **row):
+        """Queue a history row without blocking; rows are dropped if the queue is full."""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Disease history queue full, dropped {self.dropped} rows so far")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Rows being collected live on self._batch so stop() can flush them
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                try:
+                    self._batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, 0.05))
+
+            rows, self._batch = self._batch, []
+            try:
+                await asyncio.shield(asyncio.to_thread(self._flush, rows))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} disease history rows: {e}")
+
+    def _flush(self, rows: List[dict]):
+        with self.session_factory() as db:
+            # A single executemany INSERT in one transaction
+            db.execute(insert(self.model), rows)
+            db.commit()
@@ -0,0 +1,86 @@
+"""
+CPU-bound image preprocessing for disease detection, run in a process pool.
+
+Decoding, resizing and re-encoding camera photos holds the GIL, so it is
+moved out of the request threads into a bounded set of worker processes.
+The leaf triage features are computed there too, from the same thumbnail.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple, Union
+
+from PIL import Image
+
+from leaf_triage import LeafFeatures, leaf_features
+from scan_cache import image_digest
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (800, 600)
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    jpeg: bytes  # thumbnail re-encoded as JPEG, ready to send to Gemini
+    digest: str  # content hash of the normalized image, see scan_cache
+    size: Tuple[int, int]
+    leaf: LeafFeatures  # colour features for local triage, see leaf_triage
+
+
+def prepare_image(source: Union[str, bytes]) -> PreparedImage:
+    """Decode, normalize to an RGB 800x600 thumbnail and re-encode as JPEG.
+
+    ``source`` is either a path to the stored upload, which PIL reads lazily
+    from disk, or the raw encoded bytes.
+    """
+    with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding, so a
+        # 12MP phone photo is never fully materialized. Twice the target size
+        # keeps enough detail for the LANCZOS pass below.
+        if image.format == "JPEG":
+            image.draft("RGB", (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+
+        image = image.convert('RGB')
+
+    image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG")
+    return PreparedImage(
+        jpeg=buffered.getvalue(),
+        digest=image_digest(image),
+        size=image.size,
+        leaf=leaf_features(image),
+    )
+
+
+class ImagePipeline:
+    """Runs ``prepare_image`` on a process pool with a cap on queued work."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def prepare(self, source: Union[str, bytes]) -> PreparedImage:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), prepare_image, source)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
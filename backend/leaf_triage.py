@@ -0,0 +1,104 @@
+"""
+Local triage of leaf photos before they are sent to Gemini.
+
+Colour features are computed with NumPy on a small copy of the detection
+thumbnail, inside the image pipeline's worker processes. Pixels are sorted
+in HSV space into healthy green, lesion colours (yellow/brown chlorosis and
+necrosis, dark rot, white powdery coating) and everything else. Lesions are
+measured both over the whole leaf and in the worst 8x8 tile, so a handful
+of small spots on an otherwise green leaf still counts. A photo that is
+mostly green leaf with no lesion patches gets a high ``healthy_score`` and
+can be answered locally; anything else, including leaves photographed
+against soil, scores low and goes to Gemini.
+
+The score only ever short-circuits towards "healthy", so a wrong triage
+costs a missed diagnosis. Tune the threshold on labelled field photos with
+benchmarks/leaf_triage.py before relaxing it.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+SAMPLE_SIZE = (320, 240)
+TILE = 8
+
+# Hue on PIL's 0-255 scale (degrees * 255 / 360)
+GREEN_HUE = (50, 120)  # ~70-170 degrees
+LESION_HUE_MIN = 5  # lesion hues run from here up to green: ~7-70 degrees, brown to yellow
+MIN_SATURATION = 50
+MIN_VALUE = 40
+
+# Leaf must cover this share of the frame for a full score
+MIN_LEAF_COVERAGE = 0.4
+# Lesion pixels, as a share of leaf pixels, at which the score reaches zero
+LESION_TOLERANCE = 0.1
+# Lesion share of the worst tile at which the score reaches zero
+SPOT_TOLERANCE = 0.5
+
+HEALTHY_RECOMMENDATION = (
+    "Your plant looks healthy! Continue regular watering and monitoring, and inspect leaves "
+    "weekly for spots, yellowing or powdery patches. Upload a close-up if you notice any."
+)
+
+
+@dataclass(frozen=True)
+class LeafFeatures:
+    green_fraction: float  # healthy green pixels / all pixels
+    lesion_fraction: float  # lesion-coloured pixels / leaf (green + lesion) pixels
+    spot_density: float  # lesion share of the worst TILE x TILE patch
+    healthy_score: float  # 0-1
+
+
+def leaf_features(image: Image.Image) -> LeafFeatures:
+    """Colour features of an RGB image; cheap enough to run on every upload."""
+    hsv = np.asarray(image.resize(SAMPLE_SIZE, Image.Resampling.BILINEAR).convert("HSV"), dtype=np.int16)
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    coloured = (saturation >= MIN_SATURATION) & (value >= MIN_VALUE)
+    green = coloured & (hue >= GREEN_HUE[0]) & (hue <= GREEN_HUE[1])
+    lesion = coloured & (hue >= LESION_HUE_MIN) & (hue < GREEN_HUE[0])
+    # Dark rot and white powdery coating, only counted next to leaf tissue
+    near_leaf = _dilate(green)
+    lesion |= near_leaf & (value < MIN_VALUE) & (saturation >= 30)
+    lesion |= near_leaf & (saturation < 30) & (value > 200)
+
+    pixels = hue.size
+    green_count = int(green.sum())
+    lesion_count = int(lesion.sum())
+    leaf_count = green_count + lesion_count
+
+    rows, columns = lesion.shape[0] // TILE, lesion.shape[1] // TILE
+    tiles = lesion[:rows * TILE, :columns * TILE].reshape(rows, TILE, columns, TILE)
+    spot_density = float(tiles.mean(axis=(1, 3)).max())
+
+    green_fraction = green_count / pixels
+    lesion_fraction = lesion_count / leaf_count if leaf_count else 1.0
+    coverage = min(1.0, green_fraction / MIN_LEAF_COVERAGE)
+    cleanliness = max(0.0, 1.0 - max(lesion_fraction / LESION_TOLERANCE, spot_density / SPOT_TOLERANCE))
+    return LeafFeatures(
+        green_fraction=round(green_fraction, 4),
+        lesion_fraction=round(lesion_fraction, 4),
+        spot_density=round(spot_density, 4),
+        healthy_score=round(coverage * cleanliness, 4),
+    )
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    """Mask grown by one pixel in each direction (3x3 neighbourhood)."""
+    grown = mask.copy()
+    grown[1:, :] |= mask[:-1, :]
+    grown[:-1, :] |= mask[1:, :]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+
+def healthy_verdict(features: LeafFeatures) -> dict:
+    return {
+        "status": "healthy",
+        "disease": None,
+        "confidence": f"{round(features.healthy_score * 100)}%",
+        "recommendation": HEALTHY_RECOMMENDATION,
+    }
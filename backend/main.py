@@ -1,21 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import inspect, select, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, relationship
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
 from typing import Optional, List
+from contextlib import aclosing
+from collections import Counter
 import jwt
-import hashlib
-import secrets
 import os
-import requests
-import base64
-from io import BytesIO
-from PIL import Image
 import json
+import asyncio
+
+from database import create_async_db_engine, create_db_engine, create_read_engine, database_url
+from chat_cache import ChatAnswerCache
+from chat_intents import IntentMatcher
+from retrieval import Passage, load_or_build
+from disease_jobs import FINISHED_STATES, DiseaseJobQueue, JobQueueFull
+from disease_verdict import DISEASE_PROMPT, DISEASE_RESPONSE_SCHEMA, GeminiDiseaseVerdict, parse_disease_verdict
+from gemini_gateway import CircuitBreaker, GeminiGateway
+from exports import EXPORT_FORMATS, ExportUnavailable, arrow_fields, require_pyarrow, stream_arrow, stream_csv
+from history_recorder import HistoryRecorder
+from image_pipeline import ImagePipeline
+from leaf_triage import healthy_verdict
+from market_prices import MarketPriceRefresher
+from ndvi import InvalidPolygon, NdviError, NoSceneCoverage, SceneCatalog, circle_polygon, farm_vertices, health_class, latest_ndvi
+from ndvi_pipeline import NdviPipeline
+from pagination import keyset_page
+from password_hashing import HashingBusy, PasswordHasher, calibrate_iterations
+from scan_cache import ScanResultCache, cache_namespace
+from soil_ingest import SOIL_FIELDS, IngestError, insert_readings, parse_columnar, parse_ndjson
+import soil_rollups
+from user_cache import CachedUser, UserCache
+from upload_ingest import SavedUpload, UploadTooLarge, save_upload
+from weather_client import WeatherClient
 
 # Database setup with proper error handling
 import logging
@@ -25,18 +48,21 @@ import sys
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database setup with absolute path and proper error handling
-DB_PATH = os.path.abspath("plantation.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+# Database setup: DATABASE_URL selects the backend (SQLite by default), DB_PROFILE the SQLite tuning
+SQLALCHEMY_DATABASE_URL = database_url()
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
 
 try:
-    logger.info(f"Creating database at: {DB_PATH}")
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        connect_args={"check_same_thread": False},
-        echo=False  # Set to True for SQL debugging
-    )
+    logger.info(f"Connecting to database: {make_url(SQLALCHEMY_DATABASE_URL).render_as_string(hide_password=True)} (profile: {DB_PROFILE})")
+    engine = create_db_engine(SQLALCHEMY_DATABASE_URL, DB_PROFILE)
+    read_engine = create_read_engine(engine, DB_PROFILE)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    # Request handlers use the async engines; the sync ones serve background work and exports
+    async_engine = create_async_db_engine(engine, DB_PROFILE)
+    async_read_engine = async_engine if read_engine is engine else create_async_db_engine(read_engine, DB_PROFILE)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False)
     Base = declarative_base()
     logger.info("Database engine created successfully")
 except Exception as e:
@@ -93,6 +119,30 @@ class SoilReading(Base):
     
     # Relationships
     farm = relationship("Farm", back_populates="soil_readings")
+    
+    __table_args__ = (
+        # Serves keyset pagination of a farm's readings, newest first
+        Index("ix_soil_readings_farm_recorded", "farm_id", "recorded_at", "id"),
+    )
+
+class SoilReadingRollup(Base):
+    __tablename__ = "soil_reading_rollups"
+    
+    farm_id = Column(Integer, ForeignKey("farms.id"), primary_key=True)
+    resolution = Column(String, primary_key=True)  # hour, day
+    bucket_start = Column(DateTime, primary_key=True)
+    metric = Column(String, primary_key=True)  # ph_level, moisture, ...
+    min_value = Column(Float)
+    max_value = Column(Float)
+    sum_value = Column(Float)
+    count = Column(Integer)
+
+class SoilRollupBackfill(Base):
+    __tablename__ = "soil_rollup_backfills"
+    
+    # A farm is listed once its rollups cover all of its readings
+    farm_id = Column(Integer, ForeignKey("farms.id"), primary_key=True)
+    completed_at = Column(DateTime, default=datetime.utcnow)
 
 class DiseaseHistory(Base):
     __tablename__ = "disease_history"
@@ -108,6 +158,10 @@ class DiseaseHistory(Base):
     
     # Relationships
     user = relationship("User", back_populates="disease_history")
+    
+    __table_args__ = (
+        Index("ix_disease_history_user_created", "user_id", "created_at", "id"),
+    )
 
 class WeatherAlert(Base):
     __tablename__ = "weather_alerts"
@@ -120,18 +174,92 @@ class WeatherAlert(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class DiseaseJob(Base):
+    __tablename__ = "disease_jobs"
+    
+    id = Column(String, primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    image_path = Column(String)
+    image_md5 = Column(String)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    owner = Column(String)  # host:pid:token of the process running it
+    claimed_at = Column(DateTime)
+    result = Column(Text)  # JSON string
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DiseaseScanCache(Base):
+    __tablename__ = "disease_scan_cache"
+    
+    image_hash = Column(String, primary_key=True)  # namespace:sha256 of the normalized image
+    result = Column(Text)  # JSON string
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class FarmExtent(Base):
+    # Bounding box of the area measured for NDVI, for finding the farms a scene overlaps
+    __tablename__ = "farm_extents"
+    
+    farm_id = Column(Integer, ForeignKey("farms.id"), primary_key=True)
+    min_lng = Column(Float)
+    min_lat = Column(Float)
+    max_lng = Column(Float)
+    max_lat = Column(Float)
+    backfilled = Column(Boolean, default=False, index=True)  # measured against earlier scenes
+
+class FarmExtentCell(Base):
+    # Grid cells a farm's extent touches; a scene finds its farms by cell key ranges
+    __tablename__ = "farm_extent_cells"
+    
+    cell = Column(Integer, primary_key=True)  # row * columns + column of the NDVI_GRID_DEGREES grid
+    farm_id = Column(Integer, ForeignKey("farms.id"), primary_key=True, index=True)
+
+class ProcessedScene(Base):
+    __tablename__ = "processed_scenes"
+    
+    scene_id = Column(String, primary_key=True)
+    acquired = Column(DateTime)
+    status = Column(String)  # running, done, failed
+    owner = Column(String)  # host:pid:token of the process holding the claim
+    claimed_at = Column(DateTime)
+    farms = Column(Integer, default=0)
+    error = Column(Text)
+    processed_at = Column(DateTime)
+
+class FarmNdviObservation(Base):
+    __tablename__ = "farm_ndvi_observations"
+    
+    farm_id = Column(Integer, ForeignKey("farms.id"), primary_key=True)
+    scene_id = Column(String, primary_key=True)
+    acquired = Column(DateTime)
+    mean = Column(Float)
+    median = Column(Float)
+    p10 = Column(Float)
+    p90 = Column(Float)
+    std = Column(Float)
+    pixels = Column(Integer)
+    
+    __table_args__ = (
+        Index("ix_farm_ndvi_observations_farm_acquired", "farm_id", "acquired"),
+    )
+
 # Create tables with proper error handling
 try:
     logger.info("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips indexes on tables that already exist
+    for table in (SoilReading.__table__, DiseaseHistory.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     logger.info("Database tables created successfully")
     
     # Test database connection
-    with engine.connect() as conn:
-        from sqlalchemy import text
-        result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table';"))
-        tables = [row[0] for row in result.fetchall()]
-        logger.info(f"Database tables: {tables}")
+    tables = inspect(engine).get_table_names()
+    logger.info(f"Database tables: {tables}")
         
 except Exception as e:
     logger.error(f"Failed to create database tables: {e}")
@@ -197,9 +325,12 @@ class DiseaseDetectionResponse(BaseModel):
     disease: Optional[str] = None
     confidence: Optional[str] = None
     recommendation: Optional[str] = None
+    cache_hit: bool = False
+    triaged: bool = False  # answered by the local leaf triage without calling Gemini
 
 class ChatRequest(BaseModel):
     message: str
+    language: Optional[str] = None  # en, si or ta; detected from the script if omitted
 
 # FastAPI app
 app = FastAPI(title="Plantation Management System", version="1.0.0")
@@ -227,6 +358,27 @@ async def startup_event():
         logger.error(f"Startup failed: {e}")
         raise
 
+@app.on_event("shutdown")
+async def dispose_async_engines():
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+# Upload size limit
+UPLOAD_DIR = "uploads"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "50"))
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse oversized uploads from the declared length, before the body is read
+    if request.url.path.startswith("/api/disease-detection"):
+        limit = MAX_UPLOAD_BYTES * MAX_BATCH_IMAGES if request.url.path.endswith("/batch") else MAX_UPLOAD_BYTES
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": "Image too large"})
+    return await call_next(request)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -242,24 +394,50 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Authenticated users are served from memory; AUTH_CLAIMS_ONLY serves uncached users from the token's id/role claims
+AUTH_CLAIMS_ONLY = os.getenv("AUTH_CLAIMS_ONLY", "false").lower() in ("1", "true", "yes")
+user_cache = UserCache(
+    ttl_seconds=float(os.getenv("USER_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+)
+user_cache.watch(User)
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read-only session for GET routes, served from the read pool
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# Password hashing
-def hash_password(password: str) -> str:
-    salt = secrets.token_hex(16)
-    pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-    return f"{salt}${pwd_hash.hex()}"
+# Password hashing, on its own process pool. PASSWORD_HASH_TARGET_MS picks the
+# iteration count for this machine; stored hashes below it are upgraded at login.
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "0"))
+password_hasher = PasswordHasher(
+    iterations=int(os.getenv("PASSWORD_HASH_ITERATIONS", "100000")),
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None,
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "0")) or None,
+)
+
+@app.on_event("startup")
+async def calibrate_password_hashing():
+    if PASSWORD_HASH_TARGET_MS > 0:
+        password_hasher.iterations = max(
+            password_hasher.iterations,
+            await asyncio.to_thread(calibrate_iterations, PASSWORD_HASH_TARGET_MS)
+        )
+    logger.info(f"Password hashing: PBKDF2-SHA256, {password_hasher.iterations} iterations")
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    salt, pwd_hash = hashed_password.split('$')
-    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000).hex() == pwd_hash
+def hashing_busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many sign-in attempts in progress, retry shortly", headers={"Retry-After": "2"})
 
 # JWT token functions
 def create_access_token(data: dict):
@@ -269,40 +447,73 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> CachedUser:
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except jwt.PyJWTError:
+        user_id = int(user_id)
+    except (jwt.PyJWTError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    if AUTH_CLAIMS_ONLY:
+        # Id and role only; routes that show the profile call load_user
+        user = CachedUser.from_claims(user_id, payload)
+        if user is not None:
+            return user
+    
+    return await load_user(user_id)
+
+async def load_user(user_id: int) -> CachedUser:
+    """Full profile of a user, from the cache or the database."""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    async with AsyncSessionLocal() as db:
+        db_user = await db.get(User, user_id)
+        if db_user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        return user_cache.put(db_user)
+
+def get_optional_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[int]:
+    """User id from a valid bearer token, or None for anonymous requests. No DB lookup."""
+    if credentials is None:
+        return None
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload["sub"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError):
+        return None
 
 # API Routes
 
 @app.post("/api/auth/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
         logger.info(f"Attempting to register user: {user.email}")
         
         # Check if user already exists
-        existing_user = db.query(User).filter(User.email == user.email).first()
+        existing_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
         if existing_user:
             logger.warning(f"Registration failed - email already exists: {user.email}")
             raise HTTPException(status_code=400, detail="Email already registered")
             
-        existing_username = db.query(User).filter(User.username == user.username).first()
+        existing_username = (await db.execute(select(User).where(User.username == user.username))).scalar_one_or_none()
         if existing_username:
             logger.warning(f"Registration failed - username already taken: {user.username}")
             raise HTTPException(status_code=400, detail="Username already taken")
         
         # Create new user
-        hashed_password = hash_password(user.password)
+        try:
+            hashed_password = await password_hasher.hash(user.password)
+        except HashingBusy:
+            raise hashing_busy()
         crops_json = json.dumps(user.crops_grown) if user.crops_grown else None
         
         db_user = User(
@@ -316,8 +527,8 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         logger.info(f"User registered successfully: {db_user.email} (ID: {db_user.id})")
         return db_user
@@ -326,24 +537,37 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         logger.error(f"Registration error for {user.email}: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Registration failed due to server error")
 
 @app.post("/api/auth/login")
-def login_user(user: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user: UserLogin, db: AsyncSession = Depends(get_db)):
     try:
         logger.info(f"Login attempt for email: {user.email}")
         
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
         if not db_user:
             logger.warning(f"Login failed - user not found: {user.email}")
             raise HTTPException(status_code=401, detail="Invalid email or password")
             
-        if not verify_password(user.password, db_user.hashed_password):
+        try:
+            matches, rehash = await password_hasher.verify(user.password, db_user.hashed_password)
+        except HashingBusy:
+            raise hashing_busy()
+        if not matches:
             logger.warning(f"Login failed - invalid password for: {user.email}")
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
-        access_token = create_access_token(data={"sub": str(db_user.id)})
+        if rehash:
+            try:
+                db_user.hashed_password = await password_hasher.hash(user.password)
+                await db.commit()
+                logger.info(f"Upgraded password hash for user ID {db_user.id}")
+            except HashingBusy:
+                pass  # upgraded on a later login
+        
+        user_snapshot = user_cache.put(db_user)
+        access_token = create_access_token(data={"sub": str(db_user.id), **user_snapshot.claims()})
         logger.info(f"Login successful for user: {db_user.email} (ID: {db_user.id})")
         
         return {"access_token": access_token, "token_type": "bearer", "user": db_user}
@@ -355,7 +579,9 @@ def login_user(user: UserLogin, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Login failed due to server error")
 
 @app.get("/api/auth/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: CachedUser = Depends(get_current_user)):
+    if not current_user.has_profile:
+        current_user = await load_user(current_user.id)
     crops_grown = json.loads(current_user.crops_grown) if current_user.crops_grown else None
     return UserResponse(
         id=current_user.id,
@@ -369,8 +595,12 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 # Farm management endpoints
 @app.post("/api/farms", response_model=FarmResponse)
-def create_farm(farm: FarmCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_farm(farm: FarmCreate, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     polygon_json = json.dumps(farm.polygon_coords) if farm.polygon_coords else None
+    try:
+        vertices = farm_vertices(polygon_json, farm.location_lat, farm.location_lng, NDVI_DEFAULT_RADIUS_M)
+    except InvalidPolygon as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
     db_farm = Farm(
         name=farm.name,
@@ -383,21 +613,44 @@ def create_farm(farm: FarmCreate, current_user: User = Depends(get_current_user)
     )
     
     db.add(db_farm)
-    db.commit()
-    db.refresh(db_farm)
+    await db.flush()
+    # A new farm's rollups are complete from its first reading, so it never needs a backfill
+    db.add(SoilRollupBackfill(farm_id=db_farm.id))
+    
+    # Register the farm's footprint so the NDVI pipeline measures it from now on
+    db.add_all(ndvi_pipeline.extent_records(db_farm.id, vertices))
+    
+    await db.commit()
+    await db.refresh(db_farm)
+    ndvi_pipeline.wake()
     
     return db_farm
 
 @app.get("/api/farms", response_model=List[FarmResponse])
-def get_user_farms(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    farms = db.query(Farm).filter(Farm.owner_id == current_user.id).all()
+async def get_user_farms(current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    farms = (await db.execute(select(Farm).where(Farm.owner_id == current_user.id))).scalars().all()
     return farms
 
 # Weather API integration
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+
+weather_client = WeatherClient(
+    api_key=OPENWEATHER_API_KEY,
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_TTL", "1800")),
+    timeout=float(os.getenv("WEATHER_TIMEOUT", "5")),
+    connect_timeout=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2")),
+    precision=int(os.getenv("WEATHER_GEOHASH_PRECISION", "5")),
+)
+
+@app.on_event("shutdown")
+async def close_weather_client():
+    await weather_client.close()
+
 @app.get("/api/weather")
-def get_weather_data(lat: float, lng: float):
+async def get_weather_data(lat: float, lng: float):
     # OpenWeatherMap API integration
-    api_key = os.getenv("OPENWEATHER_API_KEY")
+    api_key = OPENWEATHER_API_KEY
     
     if not api_key or api_key == "your-openweather-api-key-here":
         # Return mock data if API key not configured
@@ -419,39 +672,11 @@ def get_weather_data(lat: float, lng: float):
             ]
         }
     
-    url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lng}&appid={api_key}&units=metric"
-    forecast_url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lng}&appid={api_key}&units=metric"
-    
     try:
-        # Get current weather
-        response = requests.get(url)
-        data = response.json()
-        
-        # Get 5-day forecast
-        forecast_response = requests.get(forecast_url)
-        forecast_data = forecast_response.json()
-        
-        # Process forecast data
-        forecast = []
-        for item in forecast_data["list"][:3]:  # Next 3 days
-            forecast.append({
-                "day": item["dt_txt"].split(" ")[0],
-                "temp": item["main"]["temp"],
-                "rain": item.get("rain", {}).get("3h", 0),
-                "description": item["weather"][0]["description"]
-            })
-        
-        return {
-            "temperature": data["main"]["temp"],
-            "humidity": data["main"]["humidity"],
-            "pressure": data["main"]["pressure"],
-            "wind_speed": data["wind"]["speed"],
-            "description": data["weather"][0]["description"],
-            "rain": data.get("rain", {}).get("1h", 0),
-            "forecast": forecast,
-            "alerts": []  # Add weather alerts based on conditions
-        }
+        # Current weather and forecast are fetched in parallel and cached per geohash cell
+        return await weather_client.get(lat, lng)
     except Exception as e:
+        logger.warning(f"Weather API error: {e}")
         # Fallback to mock data on API error
         return {
             "temperature": 28,
@@ -470,179 +695,397 @@ def get_weather_data(lat: float, lng: float):
             ]
         }
 
+@app.get("/api/weather/stats")
+def get_weather_stats():
+    # Cache hit ratio and upstream latency, for tuning WEATHER_CACHE_TTL
+    return weather_client.stats()
+
 # AI Disease Detection
-@app.post("/api/disease-detection", response_model=DiseaseDetectionResponse)
-def detect_disease(file: UploadFile = File(...)):
-    # Save uploaded image
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    file_path = f"{upload_dir}/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-    
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
+# One Gemini client for detection and the chatbot: caps in-flight calls, bounds
+# each by a deadline, retries transient errors and trips to the offline fallbacks
+gemini = GeminiGateway(
+    os.getenv("GEMINI_API_KEY"),
+    model_name=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20")),
+    retries=int(os.getenv("GEMINI_RETRIES", "2")),
+    breaker=CircuitBreaker(
+        window=int(os.getenv("GEMINI_BREAKER_WINDOW", "20")),
+        threshold=float(os.getenv("GEMINI_BREAKER_THRESHOLD", "0.5")),
+        cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30")),
+    ),
+)
+
+@app.get("/api/gemini/stats")
+def get_gemini_stats():
+    # Circuit state, retries and timeouts, for tuning GEMINI_TIMEOUT_SECONDS
+    return gemini.stats()
+
+image_pipeline = ImagePipeline(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "0")) or None,
+    max_pending=int(os.getenv("IMAGE_MAX_PENDING", "0")) or None,
+)
+
+@app.on_event("shutdown")
+def shutdown_image_pipeline():
+    image_pipeline.shutdown()
+
+# Local leaf triage. "on" answers clearly healthy leaves without Gemini; "shadow"
+# (the default until the threshold is calibrated on field photos) still asks
+# Gemini and only records whether triage would have agreed; "off" skips it
+TRIAGE_MODE = os.getenv("TRIAGE_MODE", "shadow").lower()
+TRIAGE_HEALTHY_THRESHOLD = float(os.getenv("TRIAGE_HEALTHY_THRESHOLD", "0.85"))
+triage_shadow = Counter()
+
+@app.get("/api/triage/stats")
+def get_triage_stats():
+    # Shadow-mode agreement with Gemini, for calibrating TRIAGE_HEALTHY_THRESHOLD
+    would_skip = triage_shadow["agreed"] + triage_shadow["disagreed"]
+    return {
+        "mode": TRIAGE_MODE,
+        "threshold": TRIAGE_HEALTHY_THRESHOLD,
+        "compared": triage_shadow["compared"],
+        "would_skip_gemini": would_skip,
+        "agreed": triage_shadow["agreed"],
+        "disagreed": triage_shadow["disagreed"],
+        "precision": round(triage_shadow["agreed"] / would_skip, 4) if would_skip else None,
+    }
+
+# Prompt, schema and verdict parser are shared with the Cloud Function (disease_verdict.py)
+DISEASE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": DISEASE_RESPONSE_SCHEMA,
+    "max_output_tokens": int(os.getenv("GEMINI_DISEASE_MAX_TOKENS", "256")),
+    "temperature": 0.2,
+}
+
+# Verdicts are cached per model, prompt, schema and parser; changing any of them starts a fresh namespace
+scan_cache = ScanResultCache(
+    SessionLocal,
+    DiseaseScanCache,
+    ttl_seconds=float(os.getenv("DISEASE_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("DISEASE_CACHE_MAX_ENTRIES", "10000")),
+    touch_interval=float(os.getenv("DISEASE_CACHE_TOUCH_INTERVAL", "600")),
+    evict_every=int(os.getenv("DISEASE_CACHE_EVICT_EVERY", "100")),
+    namespace=cache_namespace(
+        gemini.model_name, DISEASE_PROMPT, DISEASE_GENERATION_CONFIG, GeminiDiseaseVerdict.model_json_schema()
+    ),
+)
+
+MOCK_DISEASE_SCENARIOS = [
+    {
+        "status": "healthy",
+        "disease": "No disease detected",
+        "confidence": "92%",
+        "recommendation": "Your plant looks healthy! Continue regular watering and monitoring. Consider preventive measures like proper spacing, good drainage, and regular inspection for early signs of problems."
+    },
+    {
+        "status": "diseased",
+        "disease": "Powdery Mildew",
+        "confidence": "88%",
+        "recommendation": "This appears to be powdery mildew. Apply neem oil spray or sulfur-based fungicide weekly. Improve air circulation by pruning dense foliage and spacing plants properly. Avoid overhead watering."
+    },
+    {
+        "status": "diseased",
+        "disease": "Leaf Spot Disease",
+        "confidence": "85%",
+        "recommendation": "Leaf spot disease detected. Remove affected leaves immediately and dispose of them. Apply copper-based fungicide every 7-10 days. Ensure good drainage and avoid wetting leaves during watering."
+    },
+    {
+        "status": "diseased",
+        "disease": "Bacterial Blight",
+        "confidence": "79%",
+        "recommendation": "Bacterial blight identified. Remove infected plant parts and apply copper bactericide. Improve air circulation and avoid overhead irrigation. Consider using resistant varieties in future plantings."
+    },
+    {
+        "status": "diseased",
+        "disease": "Root Rot",
+        "confidence": "91%",
+        "recommendation": "Root rot detected - likely due to overwatering. Reduce watering frequency immediately. Improve soil drainage by adding organic matter. Consider repotting with fresh, well-draining soil if in containers."
+    },
+    {
+        "status": "diseased",
+        "disease": "Rust Disease",
+        "confidence": "83%",
+        "recommendation": "Rust disease present. Remove and destroy infected leaves. Apply fungicide containing myclobutanil or propiconazole. Ensure plants have adequate spacing for air circulation."
+    },
+    {
+        "status": "diseased",
+        "disease": "Aphid Infestation",
+        "confidence": "87%",
+        "recommendation": "Aphid damage visible. Spray with insecticidal soap or neem oil. Introduce beneficial insects like ladybugs. Remove heavily infested leaves. Check for ants which may be protecting aphids."
+    },
+    {
+        "status": "diseased",
+        "disease": "Nutrient Deficiency",
+        "confidence": "76%",
+        "recommendation": "Signs of nutrient deficiency detected. Test soil pH and nutrient levels. Apply balanced fertilizer or specific nutrients based on deficiency symptoms. Yellow leaves often indicate nitrogen deficiency."
+    }
+]
+
+async def analyze_with_gemini(jpeg: bytes) -> dict:
+    """Send a prepared JPEG thumbnail to Gemini Vision and parse the verdict."""
+    # The SDK takes the raw encoded bytes, no base64 round trip needed
+    response = await gemini.generate([DISEASE_PROMPT, {
+        "mime_type": "image/jpeg",
+        "data": jpeg
+    }], generation_config=DISEASE_GENERATION_CONFIG)
     
-    # Prepare image for Gemini API
-    image = Image.open(BytesIO(content))
-    image = image.convert('RGB')
-    image.thumbnail((800, 600), Image.Resampling.LANCZOS)
+    # Malformed or out-of-range output raises here and falls back like any other Gemini failure
+    return parse_disease_verdict(response.text)
+
+def mock_detection(file_hash: str) -> dict:
+    """Pick a consistent but varied mock scenario from the upload's md5 hex digest."""
+    hash_int = int(file_hash[:8], 16)
+    return MOCK_DISEASE_SCENARIOS[hash_int % len(MOCK_DISEASE_SCENARIOS)]
+
+async def run_detection(upload: SavedUpload, user_id: Optional[int] = None) -> DiseaseDetectionResponse:
+    """Preprocess a stored upload, then answer from the cache, the leaf triage, Gemini or the mock fallback."""
+    detection = await _detect(upload)
+    if user_id is not None:
+        record_detection(user_id, upload, detection)
+    return detection
+
+async def _detect(upload: SavedUpload) -> DiseaseDetectionResponse:
+    # Decode from the stored file in the process pool, off the event loop
+    prepared = await image_pipeline.prepare(upload.path)
     
-    # Convert to base64
-    buffered = BytesIO()
-    image.save(buffered, format="JPEG")
-    img_base64 = base64.b64encode(buffered.getvalue()).decode()
+    # Repeat scans of the same photo are answered from the cache
+    cached = await asyncio.to_thread(scan_cache.get, prepared.digest)
+    if cached is not None:
+        return DiseaseDetectionResponse(**cached, cache_hit=True)
     
-    # Call Gemini Vision API
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    triage_healthy = prepared.leaf.healthy_score >= TRIAGE_HEALTHY_THRESHOLD
+    if TRIAGE_MODE == "on" and triage_healthy:
+        return DiseaseDetectionResponse(**healthy_verdict(prepared.leaf), triaged=True)
     
     try:
-        # Call Gemini Vision API
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
-        
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Analyze the image for disease detection
-        prompt = """
-        Analyze this agricultural crop image and provide:
-        1. Disease status (healthy/diseased)
-        2. If diseased, identify the specific disease name
-        3. Confidence percentage
-        4. Treatment recommendations
-        
-        Focus on common crop diseases like blight, rust, powdery mildew, bacterial spots, etc.
-        Provide practical, farmer-friendly advice.
-        """
-        
-        response = model.generate_content([prompt, {
-            "mime_type": "image/jpeg",
-            "data": img_base64
-        }])
-        
-        # Parse Gemini response
-        response_text = response.text
-        lines = response_text.split('\n')
-        
-        # Extract information from response
-        status = "healthy"
-        disease = None
-        confidence = "0%"
-        recommendation = "No specific treatment needed."
-        
-        for line in lines:
-            line_lower = line.lower()
-            if "diseased" in line_lower or "disease" in line_lower:
-                status = "diseased"
-            if "confidence" in line_lower or "%" in line:
-                # Extract confidence percentage
-                import re
-                confidence_match = re.search(r'(\d+)%', line)
-                if confidence_match:
-                    confidence = confidence_match.group(1) + "%"
-            if "treatment" in line_lower or "recommend" in line_lower:
-                recommendation = line.strip()
-        
-        # If no specific disease found, try to extract disease name
-        if status == "diseased":
-            for line in lines:
-                if any(disease_name in line_lower for disease_name in ["blight", "rust", "mildew", "spot", "rot", "wilt"]):
-                    disease = line.strip()
-                    break
-        
-        gemini_response = {
-            "status": status,
-            "disease": disease,
-            "confidence": confidence,
-            "recommendation": recommendation
-        }
-        
-        return DiseaseDetectionResponse(**gemini_response)
-        
+        gemini_response = await analyze_with_gemini(prepared.jpeg)
     except Exception as e:
         # Enhanced mock responses with variety based on image analysis
-        print(f"Disease detection error: {e}")
-        
-        # Simulate different responses based on file characteristics
-        import random
-        import hashlib
-        
-        # Use file content hash to get consistent but varied results
-        file_hash = hashlib.md5(content).hexdigest()
-        hash_int = int(file_hash[:8], 16)
-        
-        # Different disease scenarios
-        disease_scenarios = [
-            {
-                "status": "healthy",
-                "disease": "No disease detected",
-                "confidence": "92%",
-                "recommendation": "Your plant looks healthy! Continue regular watering and monitoring. Consider preventive measures like proper spacing, good drainage, and regular inspection for early signs of problems."
-            },
-            {
-                "status": "diseased",
-                "disease": "Powdery Mildew",
-                "confidence": "88%",
-                "recommendation": "This appears to be powdery mildew. Apply neem oil spray or sulfur-based fungicide weekly. Improve air circulation by pruning dense foliage and spacing plants properly. Avoid overhead watering."
-            },
-            {
-                "status": "diseased",
-                "disease": "Leaf Spot Disease",
-                "confidence": "85%",
-                "recommendation": "Leaf spot disease detected. Remove affected leaves immediately and dispose of them. Apply copper-based fungicide every 7-10 days. Ensure good drainage and avoid wetting leaves during watering."
-            },
-            {
-                "status": "diseased",
-                "disease": "Bacterial Blight",
-                "confidence": "79%",
-                "recommendation": "Bacterial blight identified. Remove infected plant parts and apply copper bactericide. Improve air circulation and avoid overhead irrigation. Consider using resistant varieties in future plantings."
-            },
-            {
-                "status": "diseased",
-                "disease": "Root Rot",
-                "confidence": "91%",
-                "recommendation": "Root rot detected - likely due to overwatering. Reduce watering frequency immediately. Improve soil drainage by adding organic matter. Consider repotting with fresh, well-draining soil if in containers."
-            },
-            {
-                "status": "diseased",
-                "disease": "Rust Disease",
-                "confidence": "83%",
-                "recommendation": "Rust disease present. Remove and destroy infected leaves. Apply fungicide containing myclobutanil or propiconazole. Ensure plants have adequate spacing for air circulation."
-            },
-            {
-                "status": "diseased",
-                "disease": "Aphid Infestation",
-                "confidence": "87%",
-                "recommendation": "Aphid damage visible. Spray with insecticidal soap or neem oil. Introduce beneficial insects like ladybugs. Remove heavily infested leaves. Check for ants which may be protecting aphids."
-            },
-            {
-                "status": "diseased",
-                "disease": "Nutrient Deficiency",
-                "confidence": "76%",
-                "recommendation": "Signs of nutrient deficiency detected. Test soil pH and nutrient levels. Apply balanced fertilizer or specific nutrients based on deficiency symptoms. Yellow leaves often indicate nitrogen deficiency."
-            }
+        logger.warning(f"Disease detection fell back to a mock verdict: {e}")
+        return DiseaseDetectionResponse(**mock_detection(upload.md5))
+    
+    if TRIAGE_MODE == "shadow":
+        triage_shadow["compared"] += 1
+        if triage_healthy:
+            agreed = gemini_response["status"] == "healthy"
+            triage_shadow["agreed" if agreed else "disagreed"] += 1
+            if not agreed:
+                logger.warning(
+                    f"Triage would have missed {gemini_response['disease']} "
+                    f"(healthy_score {prepared.leaf.healthy_score}, {upload.md5})"
+                )
+    
+    await asyncio.to_thread(scan_cache.put, prepared.digest, gemini_response)
+    
+    return DiseaseDetectionResponse(**gemini_response)
+
+@app.post("/api/disease-detection", response_model=DiseaseDetectionResponse)
+async def detect_disease(file: UploadFile = File(...), user_id: Optional[int] = Depends(get_optional_user_id)):
+    # Save uploaded image chunk by chunk, enforcing the size limit as it streams
+    try:
+        upload = await save_upload(file, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    return await run_detection(upload, user_id)
+
+@app.post("/api/disease-detection/batch")
+async def detect_disease_batch(files: List[UploadFile] = File(...), user_id: Optional[int] = Depends(get_optional_user_id)):
+    """Analyze a survey of images, streaming one NDJSON line per image as each finishes."""
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
+    
+    # Spool every upload to disk before the response starts streaming
+    uploads = []
+    for file in files:
+        try:
+            uploads.append(await save_upload(file, UPLOAD_DIR, MAX_UPLOAD_BYTES))
+        except UploadTooLarge:
+            uploads.append(None)
+    
+    async def analyze(index: int, filename: str, upload: Optional[SavedUpload]) -> dict:
+        result = {"index": index, "filename": filename}
+        if upload is None:
+            result["error"] = "Image too large"
+            return result
+        try:
+            detection = await run_detection(upload, user_id)
+            result.update(detection.model_dump())
+        except Exception as e:
+            logger.error(f"Batch detection failed for {filename}: {e}")
+            result["error"] = "Analysis failed"
+        return result
+    
+    async def stream_results():
+        # Preprocessing fans out over the process pool and Gemini calls are
+        # bounded by the gateway's slots, so wall time tracks the slowest image
+        tasks = [
+            asyncio.create_task(analyze(index, file.filename, upload))
+            for index, (file, upload) in enumerate(zip(files, uploads))
         ]
-        
-        # Select scenario based on file hash for consistency
-        selected_scenario = disease_scenarios[hash_int % len(disease_scenarios)]
-        
-        return DiseaseDetectionResponse(
-            status=selected_scenario["status"],
-            disease=selected_scenario["disease"],
-            confidence=selected_scenario["confidence"],
-            recommendation=selected_scenario["recommendation"]
-        )
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Asynchronous disease analysis jobs
+async def process_disease_job(job: DiseaseJob) -> dict:
+    upload = SavedUpload(path=job.image_path, size=0, md5=job.image_md5)
+    detection = await run_detection(upload, job.user_id)
+    return detection.model_dump()
+
+disease_jobs = DiseaseJobQueue(
+    SessionLocal,
+    DiseaseJob,
+    process_disease_job,
+    workers=int(os.getenv("DISEASE_JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("DISEASE_JOB_MAX_PENDING", "200")),
+    lease=float(os.getenv("DISEASE_JOB_LEASE", "300")),
+)
+
+@app.on_event("startup")
+async def start_disease_jobs():
+    await disease_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_disease_jobs():
+    await disease_jobs.stop()
+
+@app.post("/api/disease-jobs", status_code=202)
+async def submit_disease_job(file: UploadFile = File(...), user_id: Optional[int] = Depends(get_optional_user_id)):
+    try:
+        upload = await save_upload(file, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    try:
+        job = await disease_jobs.submit(user_id=user_id, image_path=upload.path, image_md5=upload.md5)
+    except JobQueueFull:
+        os.remove(upload.path)
+        raise HTTPException(status_code=429, detail="Analysis queue is full, retry shortly", headers={"Retry-After": "10"})
+    
+    job["status_url"] = f"/api/disease-jobs/{job['job_id']}"
+    job["events_url"] = f"/api/disease-jobs/{job['job_id']}/events"
+    return job
+
+@app.get("/api/disease-jobs/{job_id}")
+async def get_disease_job(job_id: str):
+    job = await asyncio.to_thread(disease_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/disease-jobs/{job_id}/events")
+async def stream_disease_job(job_id: str, request: Request):
+    job = await asyncio.to_thread(disease_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield f"event: status\ndata: {json.dumps(current)}\n\n"
+            if current["status"] in FINISHED_STATES:
+                return
+            if await request.is_disconnected():
+                return
+            # Woken as soon as a local worker finishes; otherwise re-checks
+            # periodically and keeps the connection alive through proxies
+            await disease_jobs.wait_for_update(job_id, timeout=15)
+            yield ": keep-alive\n\n"
+            current = await asyncio.to_thread(disease_jobs.get, job_id) or current
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Disease history, written behind the detection path in batches
+history_recorder = HistoryRecorder(
+    SessionLocal,
+    DiseaseHistory,
+    batch_size=int(os.getenv("HISTORY_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("HISTORY_FLUSH_MS", "500")) / 1000,
+)
+
+# Registered after the job queue so its shutdown runs last and flushes
+# whatever the job workers recorded
+@app.on_event("startup")
+async def start_history_recorder():
+    history_recorder.start()
+
+@app.on_event("shutdown")
+async def stop_history_recorder():
+    await history_recorder.stop()
+
+def parse_confidence(confidence: Optional[str]) -> Optional[float]:
+    """'88%' -> 88.0"""
+    try:
+        return float(str(confidence).strip().rstrip('%'))
+    except ValueError:
+        return None
+
+def record_detection(user_id: int, upload: SavedUpload, detection: DiseaseDetectionResponse):
+    history_recorder.record(
+        user_id=user_id,
+        image_path=upload.path,
+        disease_name=detection.disease,
+        confidence=parse_confidence(detection.confidence),
+        recommendation=detection.recommendation,
+        status=detection.status,
+        created_at=datetime.utcnow(),
+    )
 
 @app.get("/api/disease-history")
-def get_disease_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    history = db.query(DiseaseHistory).filter(DiseaseHistory.user_id == current_user.id).order_by(DiseaseHistory.created_at.desc()).all()
-    return history
+async def get_disease_history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    stmt = select(*DiseaseHistory.__table__.columns).where(DiseaseHistory.user_id == current_user.id)
+    try:
+        return await keyset_page(db, stmt, DiseaseHistory.created_at, DiseaseHistory.id, limit, cursor, since, until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 # Soil readings
+async def get_owned_farm(db: AsyncSession, farm_id: int, owner_id: int) -> Optional[Farm]:
+    result = await db.execute(select(Farm).where(Farm.id == farm_id, Farm.owner_id == owner_id))
+    return result.scalar_one_or_none()
+
+# Readings are folded into the rollups in the background, after their insert commits
+soil_rollup_writer = soil_rollups.RollupWriter(
+    engine,
+    SoilReading.__table__,
+    SoilReadingRollup.__table__,
+    SoilRollupBackfill.__table__,
+    flush_interval=float(os.getenv("SOIL_ROLLUP_FLUSH_MS", "1000")) / 1000,
+)
+
+@app.on_event("startup")
+async def start_soil_rollups():
+    soil_rollup_writer.start()
+    # Farms whose readings predate the rollups are rebuilt in the background,
+    # resuming after an interrupted backfill
+    soil_rollup_writer.start_backfill()
+
+@app.on_event("shutdown")
+async def stop_soil_rollups():
+    await soil_rollup_writer.stop()
+
 @app.post("/api/soil-readings")
-def create_soil_reading(farm_id: int, reading: SoilReadingCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_soil_reading(farm_id: int, reading: SoilReadingCreate, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Verify farm ownership
-    farm = db.query(Farm).filter(Farm.id == farm_id, Farm.owner_id == current_user.id).first()
+    farm = await get_owned_farm(db, farm_id, current_user.id)
     if not farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
@@ -657,148 +1100,280 @@ def create_soil_reading(farm_id: int, reading: SoilReadingCreate, current_user:
     )
     
     db.add(db_reading)
-    db.commit()
-    db.refresh(db_reading)
+    await db.commit()
+    await db.refresh(db_reading)
+    soil_rollup_writer.add([
+        (db_reading.farm_id, db_reading.recorded_at, *(getattr(db_reading, field) for field in SOIL_FIELDS))
+    ])
     
     return db_reading
 
+@app.get("/api/soil-readings/{farm_id}/summary")
+async def get_soil_summary(
+    farm_id: int,
+    resolution: str = Query("day", pattern="^(hour|day)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Per-bucket min/max/mean/count of every soil metric, served from the rollup table."""
+    farm = await get_owned_farm(db, farm_id, current_user.id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    query = select(SoilReadingRollup).where(
+        SoilReadingRollup.farm_id == farm_id,
+        SoilReadingRollup.resolution == resolution
+    )
+    if since is not None:
+        query = query.where(SoilReadingRollup.bucket_start >= since)
+    if until is not None:
+        query = query.where(SoilReadingRollup.bucket_start < until)
+    
+    rows = (await db.execute(query.order_by(SoilReadingRollup.bucket_start))).scalars().all()
+    return {"farm_id": farm_id, "resolution": resolution, "buckets": soil_rollups.summarize(rows)}
+
+@app.post("/api/soil-readings/{farm_id}/summary/rebuild")
+async def rebuild_soil_summary(farm_id: int, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    farm = await get_owned_farm(db, farm_id, current_user.id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    readings = await soil_rollup_writer.rebuild(farm_id)
+    return {"farm_id": farm_id, "readings": readings}
+
+SOIL_BULK_MAX_ROWS = int(os.getenv("SOIL_BULK_MAX_ROWS", "500000"))
+
+@app.post("/api/soil-readings/bulk")
+async def bulk_create_soil_readings(request: Request, current_user: CachedUser = Depends(get_current_user)):
+    """Ingest many readings across farms from NDJSON or a columnar JSON batch."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+            # Parsed line by line as the body streams in
+            rows = await parse_ndjson(request.stream(), SOIL_BULK_MAX_ROWS)
+        elif content_type == "application/json":
+            rows = parse_columnar(json.loads(await request.body()), SOIL_BULK_MAX_ROWS)
+        else:
+            raise HTTPException(status_code=415, detail="Send application/x-ndjson or columnar application/json")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+    except IngestError as e:
+        # Well-formed body whose readings or columns are invalid
+        raise HTTPException(status_code=422, detail=f"Invalid batch: {e}")
+    
+    result = await asyncio.to_thread(
+        insert_readings, engine, SoilReading.__table__, Farm.__table__, current_user.id, rows, soil_rollup_writer.add
+    )
+    logger.info(f"Bulk soil ingest for user {current_user.id}: {result['inserted']} readings")
+    return result
+
 @app.get("/api/soil-readings/{farm_id}")
-def get_soil_readings(farm_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_soil_readings(
+    farm_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
     # Verify farm ownership
-    farm = db.query(Farm).filter(Farm.id == farm_id, Farm.owner_id == current_user.id).first()
+    farm = await get_owned_farm(db, farm_id, current_user.id)
     if not farm:
         raise HTTPException(status_code=404, detail="Farm not found")
     
-    readings = db.query(SoilReading).filter(SoilReading.farm_id == farm_id).order_by(SoilReading.recorded_at.desc()).all()
-    return readings
+    stmt = select(*SoilReading.__table__.columns).where(SoilReading.farm_id == farm_id)
+    try:
+        return await keyset_page(db, stmt, SoilReading.recorded_at, SoilReading.id, limit, cursor, since, until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Streaming exports
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+def export_response(stmt, columns, fmt: str, filename: str) -> StreamingResponse:
+    media_type, extension = EXPORT_FORMATS[fmt]
+    if fmt == "csv":
+        body = stream_csv(read_engine, stmt, [column.key for column in columns], EXPORT_CHUNK_ROWS)
+    else:
+        try:
+            require_pyarrow()
+        except ExportUnavailable as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        body = stream_arrow(read_engine, stmt, arrow_fields(columns), fmt, EXPORT_CHUNK_ROWS)
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+@app.get("/api/exports/soil-readings")
+async def export_soil_readings(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|arrow|parquet)$"),
+    farm_id: Optional[int] = None,
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Stream one farm's readings, or those of every farm the user owns."""
+    if farm_id is not None:
+        farm = await get_owned_farm(db, farm_id, current_user.id)
+        if not farm:
+            raise HTTPException(status_code=404, detail="Farm not found")
+        farm_filter = SoilReading.farm_id == farm_id
+    else:
+        farm_filter = SoilReading.farm_id.in_(select(Farm.id).where(Farm.owner_id == current_user.id))
+    
+    columns = list(SoilReading.__table__.columns)
+    stmt = select(*columns).where(farm_filter).order_by(SoilReading.farm_id, SoilReading.recorded_at, SoilReading.id)
+    return export_response(stmt, columns, fmt, f"soil_readings_{farm_id or 'all'}")
+
+@app.get("/api/exports/disease-history")
+def export_disease_history(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|arrow|parquet)$"),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    columns = list(DiseaseHistory.__table__.columns)
+    stmt = select(*columns).where(DiseaseHistory.user_id == current_user.id).order_by(DiseaseHistory.created_at, DiseaseHistory.id)
+    return export_response(stmt, columns, fmt, "disease_history")
 
 # Market prices with Alpha Vantage API
+market_refresher = MarketPriceRefresher(
+    api_key=os.getenv("ALPHA_VANTAGE_API_KEY"),
+    interval=float(os.getenv("MARKET_REFRESH_INTERVAL", "3600")),
+)
+
+@app.on_event("startup")
+async def start_market_refresher():
+    market_refresher.start()
+
+@app.on_event("shutdown")
+async def stop_market_refresher():
+    await market_refresher.stop()
+
 @app.get("/api/market-prices")
-def get_market_prices():
-    api_key = os.getenv("ALPHA_VANTAGE_API_KEY")
+async def get_market_prices(request: Request):
+    # Served from the in-memory snapshot; upstream is only hit by the refresher
+    snapshot = market_refresher.snapshot
+    headers = {"ETag": snapshot.etag, "Cache-Control": "public, max-age=60"}
     
-    if not api_key or api_key == "your-alpha-vantage-api-key":
-        # Return mock data if API key not configured
-        return [
-            {"crop": "Rice", "price": 1200, "location": "Colombo", "trend": "up"},
-            {"crop": "Tea", "price": 850, "location": "Kandy", "trend": "stable"},
-            {"crop": "Coconut", "price": 150, "location": "Galle", "trend": "down"},
-            {"crop": "Cocoa", "price": 2800, "location": "Jaffna", "trend": "up"},
-            {"crop": "Cinnamon", "price": 3200, "location": "Matale", "trend": "up"},
-            {"crop": "Pepper", "price": 1800, "location": "Kurunegala", "trend": "stable"},
-            {"crop": "Eggplant", "price": 180, "location": "Anuradhapura", "trend": "down"}
-        ]
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or snapshot.etag in tags:
+            return Response(status_code=304, headers=headers)
     
-    try:
-        # Alpha Vantage API for commodity prices
-        # Using FOREX function as commodity function doesn't exist
-        url = f"https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=USD&to_symbol=LKR&apikey={api_key}"
-        
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        # Process Alpha Vantage data and combine with local market data
-        market_prices = [
-            {"crop": "Rice", "price": 1200, "location": "Colombo", "trend": "up"},
-            {"crop": "Tea", "price": 850, "location": "Kandy", "trend": "stable"},
-            {"crop": "Coconut", "price": 150, "location": "Galle", "trend": "down"},
-            {"crop": "Cocoa", "price": 2800, "location": "Jaffna", "trend": "up"},
-            {"crop": "Cinnamon", "price": 3200, "location": "Matale", "trend": "up"},
-            {"crop": "Pepper", "price": 1800, "location": "Kurunegala", "trend": "stable"},
-            {"crop": "Eggplant", "price": 180, "location": "Anuradhapura", "trend": "down"}
-        ]
-        
-        # Add real-time commodity data if available
-        if "data" in data and data["data"]:
-            commodity_data = data["data"]
-            # Map commodity data to our crops
-            for price in market_prices:
-                if price["crop"] == "Rice" and "value" in commodity_data:
-                    # Adjust rice price based on commodity index
-                    base_price = float(commodity_data["value"])
-                    price["price"] = int(base_price * 10)  # Scale to local currency
-                    price["trend"] = "up" if base_price > 100 else "down"
-        
-        return market_prices
-        
-    except Exception as e:
-        # Fallback to mock data on API error
-        return [
-            {"crop": "Rice", "price": 1200, "location": "Colombo", "trend": "up"},
-            {"crop": "Tea", "price": 850, "location": "Kandy", "trend": "stable"},
-            {"crop": "Coconut", "price": 150, "location": "Galle", "trend": "down"},
-            {"crop": "Cocoa", "price": 2800, "location": "Jaffna", "trend": "up"},
-            {"crop": "Cinnamon", "price": 3200, "location": "Matale", "trend": "up"},
-            {"crop": "Pepper", "price": 1800, "location": "Kurunegala", "trend": "stable"},
-            {"crop": "Eggplant", "price": 180, "location": "Anuradhapura", "trend": "down"}
-        ]
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # Weather alerts
 @app.get("/api/weather-alerts")
-def get_weather_alerts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    alerts = db.query(WeatherAlert).filter(WeatherAlert.user_id == current_user.id, WeatherAlert.is_read == False).all()
+async def get_weather_alerts(current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(WeatherAlert).where(WeatherAlert.user_id == current_user.id, WeatherAlert.is_read == False))
+    alerts = result.scalars().all()
     return alerts
 
+# Plant tips and care information
+PLANT_TIPS = {
+    "general": [
+        {
+            "title": "Soil Preparation",
+            "tip": "Test soil pH before planting. Most crops prefer pH 6.0-7.0. Add lime to raise pH or sulfur to lower it.",
+            "icon": "🌱"
+        },
+        {
+            "title": "Watering Schedule",
+            "tip": "Water deeply but less frequently. Early morning is the best time to water plants.",
+            "icon": "💧"
+        },
+        {
+            "title": "Fertilizer Application",
+            "tip": "Use organic fertilizers like compost or manure. Apply during growing season for best results.",
+            "icon": "🌿"
+        }
+    ],
+    "tea": [
+        {
+            "title": "Tea Plant Care",
+            "tip": "Tea plants need well-drained soil and partial shade. Prune regularly to maintain bush shape.",
+            "icon": "🍃"
+        },
+        {
+            "title": "Harvesting Tips",
+            "tip": "Pick the top two leaves and bud for best quality. Harvest every 7-14 days during growing season.",
+            "icon": "✂️"
+        }
+    ],
+    "rice": [
+        {
+            "title": "Rice Cultivation",
+            "tip": "Rice needs flooded fields. Maintain 2-3 inches of water during growing season.",
+            "icon": "🌾"
+        },
+        {
+            "title": "Pest Control",
+            "tip": "Use integrated pest management. Monitor for stem borers and leaf folders regularly.",
+            "icon": "🐛"
+        }
+    ]
+}
+
+@app.get("/api/plant-tips")
+def get_plant_tips(crop_type: str = None):
+    if crop_type and crop_type in PLANT_TIPS:
+        return PLANT_TIPS[crop_type]
+    return PLANT_TIPS["general"]
+
 # Gemini Chatbot for agricultural questions
-@app.post("/api/chatbot")
-def chat_with_gemini(payload: ChatRequest):
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
+chat_cache = ChatAnswerCache(
+    ttl_seconds=float(os.getenv("CHAT_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000")),
+    similarity=float(os.getenv("CHAT_CACHE_SIMILARITY", "0.85")),
+)
 
-    # If API key is missing, provide intelligent responses based on keywords
-    if not gemini_api_key:
-        message_lower = payload.message.lower()
-        
-        # Provide intelligent responses based on common agricultural questions
-        if any(word in message_lower for word in ['rice', 'paddy']):
-            response = (
-                "For rice cultivation: Plant in flooded fields, maintain 2-3 inches water depth, "
-                "use certified seeds, apply fertilizer in 3 splits, and harvest when 80% grains are mature. "
-                "Common diseases include blast, bacterial blight, and sheath blight. Use resistant varieties and proper water management."
-            )
-        elif any(word in message_lower for word in ['tea', 'camellia']):
-            response = (
-                "For tea farming: Plant in well-drained soil with partial shade, prune annually, "
-                "maintain soil pH 5.5-6.5, fertilize with nitrogen-rich fertilizer, and pluck top two leaves and bud every 7-14 days. "
-                "Watch for tea blister blight, red rust, and brown root rot."
-            )
-        elif any(word in message_lower for word in ['disease', 'sick', 'pest', 'bug']):
-            response = (
-                "For plant diseases: Identify the symptoms first (yellowing, spots, wilting), improve air circulation, "
-                "remove affected parts, apply appropriate fungicides or pesticides, and ensure proper drainage. "
-                "Prevention through good cultural practices is key."
-            )
-        elif any(word in message_lower for word in ['soil', 'fertilizer', 'nutrient']):
-            response = (
-                "For soil management: Test soil pH (most crops prefer 6.0-7.0), add organic matter like compost, "
-                "use balanced NPK fertilizers, ensure proper drainage, and practice crop rotation. "
-                "Soil testing every 2-3 years is recommended."
-            )
-        elif any(word in message_lower for word in ['water', 'irrigation', 'drought']):
-            response = (
-                "For water management: Water deeply but less frequently, early morning is best, "
-                "use drip irrigation for efficiency, mulch to retain moisture, and monitor soil moisture levels. "
-                "Avoid overwatering which can cause root rot."
-            )
-        else:
-            response = (
-                "I'm an agricultural assistant. Ask me about: crop cultivation (rice, tea, vegetables), "
-                "plant diseases and treatments, soil management, irrigation, pest control, or farm management. "
-                "For example: 'How to grow rice?' or 'What causes yellow leaves?'"
-            )
-        
-        return {
-            "response": response,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+@app.get("/api/chatbot/stats")
+def get_chatbot_stats():
+    # Answer cache hit ratio, for tuning CHAT_CACHE_SIMILARITY
+    return chat_cache.stats()
 
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
+# Offline answers: intents and keywords in chat_intents.json, compiled into one matcher
+CHAT_INTENTS_PATH = os.getenv("CHAT_INTENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_intents.json"))
+chat_intents = IntentMatcher.load(CHAT_INTENTS_PATH)
+
+# Local BM25 index over the crop guide pages and plant tips. Confident matches are
+# answered directly; otherwise the best passages are given to Gemini as context.
+PLANT_PAGES_DIR = os.getenv("PLANT_PAGES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "plants"))
+RETRIEVAL_INDEX_PATH = os.getenv("RETRIEVAL_INDEX_PATH", "retrieval_index.json")
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "2.5"))
+RETRIEVAL_MIN_COVERAGE = float(os.getenv("RETRIEVAL_MIN_COVERAGE", "0.8"))
+# A one-term match is only answered directly if it clearly beats the runner-up
+RETRIEVAL_MIN_MARGIN = float(os.getenv("RETRIEVAL_MIN_MARGIN", "1.5"))
+RETRIEVAL_CONTEXT_PASSAGES = int(os.getenv("RETRIEVAL_CONTEXT_PASSAGES", "3"))
+retrieval_index = load_or_build(PLANT_PAGES_DIR, PLANT_TIPS, RETRIEVAL_INDEX_PATH)
 
-        model = genai.GenerativeModel('gemini-1.5-flash')
+def retrieve_answer(message: str):
+    """(direct answer or None, passages to use as Gemini context)."""
+    results = retrieval_index.search(message, max(RETRIEVAL_CONTEXT_PASSAGES, 2))
+    if not results:
+        return None, []
+    top, score = results[0]
+    runner_up = results[1][1] if len(results) > 1 else 0.0
+    specific = retrieval_index.matched_terms(message, top) >= 2 or score >= RETRIEVAL_MIN_MARGIN * runner_up
+    if specific and score >= RETRIEVAL_MIN_SCORE and retrieval_index.coverage(message, top) >= RETRIEVAL_MIN_COVERAGE:
+        return top, []
+    return None, [passage for passage, _ in results[:RETRIEVAL_CONTEXT_PASSAGES]]
 
-        # Restrict to agricultural questions only
-        agricultural_prompt = f"""
+def build_chat_prompt(message: str, passages: List[Passage] = ()) -> str:
+    # Restrict to agricultural questions only
+    reference = ""
+    if passages:
+        notes = "\n".join(f"        - {passage.title}: {passage.text}" for passage in passages)
+        reference = f"""
+        Reference notes from our crop guides (use them where relevant):
+{notes}
+        """
+    return f"""
         You are an agricultural expert assistant. Only answer questions related to:
         - Crop farming and cultivation
         - Plant diseases and treatments
@@ -809,12 +1384,42 @@ def chat_with_gemini(payload: ChatRequest):
         
         If the question is not related to agriculture, politely decline and ask for an agricultural question.
         
-        User question: {payload.message}
+        {reference}
+        User question: {message}
         
         Provide helpful, practical advice for farmers. Keep responses concise and actionable.
         """
-        
-        response = model.generate_content(agricultural_prompt)
+
+@app.post("/api/chatbot")
+async def chat_with_gemini(payload: ChatRequest):
+    # Questions our crop guides answer well never leave the server
+    passage, context = retrieve_answer(payload.message)
+    if passage is not None:
+        return {
+            "response": f"{passage.title}: {passage.text}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "sources": [passage.source]
+        }
+
+    # If API key is missing, provide intelligent responses based on keywords
+    if not gemini.configured:
+        return {
+            "response": chat_intents.respond(payload.message),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    # Repeated and near-duplicate questions are answered from the cache
+    cached = chat_cache.get(payload.message, payload.language)
+    if cached is not None:
+        return {
+            "response": cached,
+            "timestamp": datetime.utcnow().isoformat(),
+            "cached": True
+        }
+
+    try:
+        response = await gemini.generate(build_chat_prompt(payload.message, context))
+        chat_cache.put(payload.message, response.text, payload.language)
         
         return {
             "response": response.text,
@@ -822,124 +1427,179 @@ def chat_with_gemini(payload: ChatRequest):
         }
         
     except Exception as e:
-        # Log the error for debugging
-        print(f"Gemini API error: {e}")
+        logger.warning(f"Chatbot fell back to keyword intents: {e}")
         
         # Return intelligent fallback based on keywords
-        message_lower = payload.message.lower()
-        
-        if any(word in message_lower for word in ['rice', 'paddy']):
-            response = (
-                "For rice cultivation: Plant in flooded fields, maintain 2-3 inches water depth, "
-                "use certified seeds, apply fertilizer in 3 splits, and harvest when 80% grains are mature. "
-                "Common diseases include blast, bacterial blight, and sheath blight. Use resistant varieties and proper water management."
-            )
-        elif any(word in message_lower for word in ['tea', 'camellia']):
-            response = (
-                "For tea farming: Plant in well-drained soil with partial shade, prune annually, "
-                "maintain soil pH 5.5-6.5, fertilize with nitrogen-rich fertilizer, and pluck top two leaves and bud every 7-14 days. "
-                "Watch for tea blister blight, red rust, and brown root rot."
-            )
-        elif any(word in message_lower for word in ['disease', 'sick', 'pest', 'bug']):
-            response = (
-                "For plant diseases: Identify the symptoms first (yellowing, spots, wilting), improve air circulation, "
-                "remove affected parts, apply appropriate fungicides or pesticides, and ensure proper drainage. "
-                "Prevention through good cultural practices is key."
-            )
-        elif any(word in message_lower for word in ['soil', 'fertilizer', 'nutrient']):
-            response = (
-                "For soil management: Test soil pH (most crops prefer 6.0-7.0), add organic matter like compost, "
-                "use balanced NPK fertilizers, ensure proper drainage, and practice crop rotation. "
-                "Soil testing every 2-3 years is recommended."
-            )
-        elif any(word in message_lower for word in ['water', 'irrigation', 'drought']):
-            response = (
-                "For water management: Water deeply but less frequently, early morning is best, "
-                "use drip irrigation for efficiency, mulch to retain moisture, and monitor soil moisture levels. "
-                "Avoid overwatering which can cause root rot."
-            )
-        else:
-            response = (
-                "I'm an agricultural assistant. Ask me about: crop cultivation (rice, tea, vegetables), "
-                "plant diseases and treatments, soil management, irrigation, pest control, or farm management. "
-                "For example: 'How to grow rice?' or 'What causes yellow leaves?'"
-            )
-        
         return {
-            "response": response,
+            "response": chat_intents.respond(payload.message),
             "timestamp": datetime.utcnow().isoformat()
         }
 
-# Plant tips and care information
-@app.get("/api/plant-tips")
-def get_plant_tips(crop_type: str = None):
-    tips_data = {
-        "general": [
-            {
-                "title": "Soil Preparation",
-                "tip": "Test soil pH before planting. Most crops prefer pH 6.0-7.0. Add lime to raise pH or sulfur to lower it.",
-                "icon": "🌱"
-            },
-            {
-                "title": "Watering Schedule",
-                "tip": "Water deeply but less frequently. Early morning is the best time to water plants.",
-                "icon": "💧"
-            },
-            {
-                "title": "Fertilizer Application",
-                "tip": "Use organic fertilizers like compost or manure. Apply during growing season for best results.",
-                "icon": "🌿"
-            }
-        ],
-        "tea": [
-            {
-                "title": "Tea Plant Care",
-                "tip": "Tea plants need well-drained soil and partial shade. Prune regularly to maintain bush shape.",
-                "icon": "🍃"
-            },
-            {
-                "title": "Harvesting Tips",
-                "tip": "Pick the top two leaves and bud for best quality. Harvest every 7-14 days during growing season.",
-                "icon": "✂️"
-            }
-        ],
-        "rice": [
-            {
-                "title": "Rice Cultivation",
-                "tip": "Rice needs flooded fields. Maintain 2-3 inches of water during growing season.",
-                "icon": "🌾"
-            },
-            {
-                "title": "Pest Control",
-                "tip": "Use integrated pest management. Monitor for stem borers and leaf folders regularly.",
-                "icon": "🐛"
-            }
-        ]
-    }
+@app.post("/api/chatbot/stream")
+async def stream_chat_with_gemini(payload: ChatRequest, request: Request):
+    """The chatbot answer as Server-Sent Events: ``chunk`` events carrying text
+    as Gemini generates it, then a single ``done`` event."""
+
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def events():
+        source = "fallback"
+        passage, context = retrieve_answer(payload.message)
+        cached = chat_cache.get(payload.message, payload.language) if gemini.configured and passage is None else None
+        if passage is not None:
+            source = "retrieval"
+            yield sse("chunk", {"text": f"{passage.title}: {passage.text}"})
+        elif cached is not None:
+            source = "cache"
+            yield sse("chunk", {"text": cached})
+        elif gemini.configured:
+            parts = []
+            try:
+                # aclosing frees the Gemini slot as soon as the client goes away
+                async with aclosing(gemini.stream(build_chat_prompt(payload.message, context))) as stream:
+                    async for text in stream:
+                        if await request.is_disconnected():
+                            return
+                        parts.append(text)
+                        yield sse("chunk", {"text": text})
+                source = "gemini"
+                chat_cache.put(payload.message, "".join(parts), payload.language)
+            except Exception as e:
+                logger.warning(f"Chatbot stream failed after {len(parts)} chunks: {e}")
+                if parts:
+                    # Part of the answer is already on screen; end it rather than append a canned one
+                    yield sse("error", {"detail": "The answer was interrupted, please ask again"})
+                    source = "gemini"
+        if source == "fallback":
+            yield sse("chunk", {"text": chat_intents.respond(payload.message)})
+        done = {"source": source, "timestamp": datetime.utcnow().isoformat()}
+        if passage is not None:
+            done["sources"] = [passage.source]
+        yield sse("done", done)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# NDVI from local red/NIR scenes (see ndvi.py for the directory layout)
+NDVI_SCENES_DIR = os.getenv("NDVI_SCENES_DIR", "ndvi_scenes")
+NDVI_DEFAULT_RADIUS_M = float(os.getenv("NDVI_DEFAULT_RADIUS_M", "100"))
+NDVI_MAX_PIXELS = int(os.getenv("NDVI_MAX_PIXELS", "25000000"))
+ndvi_catalog = SceneCatalog(NDVI_SCENES_DIR)
+
+# Measures each new scene once for the farms it covers, into FarmNdviObservation
+ndvi_pipeline = NdviPipeline(
+    ndvi_catalog,
+    SessionLocal,
+    Farm,
+    FarmExtent,
+    FarmExtentCell,
+    ProcessedScene,
+    FarmNdviObservation,
+    default_radius_m=NDVI_DEFAULT_RADIUS_M,
+    max_pixels=NDVI_MAX_PIXELS,
+    workers=int(os.getenv("NDVI_WORKERS", "0")) or None,
+    interval=float(os.getenv("NDVI_SCAN_INTERVAL", "300")),
+    claim_lease=float(os.getenv("NDVI_CLAIM_LEASE", "3600")),
+    grid_degrees=float(os.getenv("NDVI_GRID_DEGREES", "0.1")),
+)
+
+@app.on_event("startup")
+async def start_ndvi_pipeline():
+    ndvi_pipeline.start()
+
+@app.on_event("shutdown")
+async def close_ndvi_catalog():
+    await ndvi_pipeline.stop()
+    ndvi_catalog.close()
+
+def ndvi_report(vertices, coordinates) -> dict:
+    try:
+        stats = latest_ndvi(ndvi_catalog, vertices, NDVI_MAX_PIXELS)
+    except NoSceneCoverage as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except NdviError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
-    if crop_type and crop_type in tips_data:
-        return tips_data[crop_type]
-    return tips_data["general"]
+    health_status, recommendations = health_class(stats["mean"])
+    return {
+        "coordinates": coordinates,
+        "ndvi_value": round(stats["mean"], 2),
+        "health_status": health_status,
+        "last_updated": stats["acquired"],
+        "recommendations": recommendations,
+        "scene_id": stats["scene_id"],
+        "statistics": stats
+    }
 
-# NDVI/Satellite data endpoint
 @app.get("/api/satellite-data")
-def get_satellite_data(lat: float, lng: float):
-    # Mock NDVI data - replace with actual satellite API
-    import random
-    
-    ndvi_data = {
-        "coordinates": [lat, lng],
-        "ndvi_value": round(random.uniform(0.2, 0.8), 2),
-        "health_status": "Good" if random.uniform(0.2, 0.8) > 0.5 else "Needs Attention",
-        "last_updated": datetime.utcnow().isoformat(),
-        "recommendations": [
-            "Monitor soil moisture levels",
-            "Check for pest infestations",
-            "Consider fertilizer application"
-        ]
-    }
+async def get_satellite_data(lat: float, lng: float, radius_m: float = Query(NDVI_DEFAULT_RADIUS_M, gt=0, le=5000)):
+    # Windowed raster reads and NumPy work stay off the event loop
+    return await asyncio.to_thread(ndvi_report, circle_polygon(lat, lng, radius_m), [lat, lng])
+
+@app.get("/api/farms/{farm_id}/satellite-data")
+async def get_farm_satellite_data(farm_id: int, current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    farm = await get_owned_farm(db, farm_id, current_user.id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    # The drawn field boundary when there is one, otherwise a circle around the farm's pin
+    try:
+        vertices = farm_vertices(farm.polygon_coords, farm.location_lat, farm.location_lng, NDVI_DEFAULT_RADIUS_M)
+    except InvalidPolygon as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return await asyncio.to_thread(ndvi_report, vertices, [farm.location_lat, farm.location_lng])
+
+@app.get("/api/farms/{farm_id}/ndvi")
+async def get_farm_ndvi_series(
+    farm_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """NDVI per processed scene for a farm, oldest first, with the trend across them."""
+    farm = await get_owned_farm(db, farm_id, current_user.id)
+    if not farm:
+        raise HTTPException(status_code=404, detail="Farm not found")
+    
+    query = select(FarmNdviObservation).where(FarmNdviObservation.farm_id == farm_id)
+    if since:
+        query = query.where(FarmNdviObservation.acquired >= since)
+    if until:
+        query = query.where(FarmNdviObservation.acquired <= until)
+    # The most recent ``limit`` observations, returned in time order
+    rows = (await db.execute(query.order_by(FarmNdviObservation.acquired.desc()).limit(limit))).scalars().all()
+    rows.reverse()
+    
+    observations = [{
+        "acquired": row.acquired.isoformat(),
+        "scene_id": row.scene_id,
+        "mean": row.mean,
+        "median": row.median,
+        "p10": row.p10,
+        "p90": row.p90,
+        "std": row.std,
+        "pixels": row.pixels,
+        "health_status": health_class(row.mean)[0]
+    } for row in rows]
+    
+    trend = None
+    if observations:
+        latest = rows[-1]
+        trend = {"latest": latest.mean, "health_status": observations[-1]["health_status"], "change": None, "slope_per_30_days": None}
+        if len(rows) > 1:
+            trend["change"] = round(latest.mean - rows[-2].mean, 4)
+            # Least-squares slope of mean NDVI over time
+            days = [(row.acquired - rows[0].acquired).total_seconds() / 86400 for row in rows]
+            values = [row.mean for row in rows]
+            mean_day, mean_value = sum(days) / len(days), sum(values) / len(values)
+            spread = sum((day - mean_day) ** 2 for day in days)
+            if spread > 0:
+                slope = sum((day - mean_day) * (value - mean_value) for day, value in zip(days, values)) / spread
+                trend["slope_per_30_days"] = round(slope * 30, 4)
     
-    return ndvi_data
+    return {"farm_id": farm_id, "observations": observations, "trend": trend}
 
 if __name__ == "__main__":
     import uvicorn
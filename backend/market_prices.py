@@ -0,0 +1,122 @@
+"""
+Market price snapshot served from memory and refreshed in the background.
+
+Alpha Vantage is polled on a fixed schedule, never per request, so upstream
+quota use is flat regardless of traffic.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+# Local market data the upstream figures are combined with
+BASE_MARKET_PRICES: Tuple[dict, ...] = (
+    {"crop": "Rice", "price": 1200, "location": "Colombo", "trend": "up"},
+    {"crop": "Tea", "price": 850, "location": "Kandy", "trend": "stable"},
+    {"crop": "Coconut", "price": 150, "location": "Galle", "trend": "down"},
+    {"crop": "Cocoa", "price": 2800, "location": "Jaffna", "trend": "up"},
+    {"crop": "Cinnamon", "price": 3200, "location": "Matale", "trend": "up"},
+    {"crop": "Pepper", "price": 1800, "location": "Kurunegala", "trend": "stable"},
+    {"crop": "Eggplant", "price": 180, "location": "Anuradhapura", "trend": "down"},
+)
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    body: bytes  # pre-serialized JSON list
+    etag: str
+    generated_at: datetime
+    source: str  # mock, alpha_vantage
+
+
+def build_snapshot(prices, source: str) -> MarketSnapshot:
+    body = json.dumps(list(prices), separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return MarketSnapshot(body=body, etag=etag, generated_at=datetime.utcnow(), source=source)
+
+
+def apply_upstream(data: dict) -> list:
+    """Combine an Alpha Vantage payload with the local market data."""
+    market_prices = [dict(price) for price in BASE_MARKET_PRICES]
+
+    # Add real-time commodity data if available
+    if "data" in data and data["data"]:
+        commodity_data = data["data"]
+        # Map commodity data to our crops
+        for price in market_prices:
+            if price["crop"] == "Rice" and "value" in commodity_data:
+                # Adjust rice price based on commodity index
+                base_price = float(commodity_data["value"])
+                price["price"] = int(base_price * 10)  # Scale to local currency
+                price["trend"] = "up" if base_price > 100 else "down"
+
+    return market_prices
+
+
+class MarketPriceRefresher:
+    """Owns the current snapshot and the task that keeps it up to date."""
+
+    def __init__(self, api_key: Optional[str], interval: float = 3600, timeout: float = 10.0):
+        self.api_key = api_key
+        self.interval = interval
+        self.timeout = timeout
+        self.snapshot = build_snapshot(BASE_MARKET_PRICES, source="mock")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) and self.api_key != "your-alpha-vantage-api-key"
+
+    def start(self):
+        if self.configured and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            while True:
+                try:
+                    await self.refresh_once(client)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Keep serving the last good snapshot
+                    logger.warning(f"Market price refresh failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def refresh_once(self, client: httpx.AsyncClient):
+        # Using FOREX function as commodity function doesn't exist
+        response = await client.get(ALPHA_VANTAGE_URL, params={
+            "function": "FX_DAILY",
+            "from_symbol": "USD",
+            "to_symbol": "LKR",
+            "apikey": self.api_key,
+        })
+        response.raise_for_status()
+        data = response.json()
+
+        # Rate-limited and invalid-key responses still come back as 200
+        if "Note" in data or "Information" in data or "Error Message" in data:
+            raise ValueError(data.get("Note") or data.get("Information") or data.get("Error Message"))
+
+        # Swap in a new immutable snapshot; readers never see a partial update
+        self.snapshot = build_snapshot(apply_upstream(data), source="alpha_vantage")
+        logger.info(f"Market price snapshot refreshed ({self.snapshot.etag})")
@@ -0,0 +1,493 @@
+"""
+NDVI from local multispectral scenes.
+
+A scene is a directory under the scenes root holding a red and a near-infrared
+band as GeoTIFF/COG (``red.tif``/``nir.tif``, or Sentinel-2 style
+``*B04.tif``/``*B08.tif``) and optionally a ``scene.json`` with the
+acquisition time (``{"acquired": "2024-05-01T10:20:00"}``).
+
+Bands are opened through rasterio when it is installed, which handles any CRS
+and reads only the blocks a window touches. Without it, tifffile is used for
+scenes in geographic coordinates (EPSG:4326): uncompressed rasters are memory
+mapped and tiled or striped ones are decoded one segment at a time, so only
+the part of the scene under a farm is ever read into memory.
+
+The farm's outline (its polygon, or a circle around its location) is
+converted to pixel space, the covering window is read from both bands and
+NDVI is computed with NumPy over the pixels whose centres fall inside it.
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BAND_PATTERNS = {
+    "red": ("red.tif", "red.tiff", "*B04.tif", "*B04.tiff"),
+    "nir": ("nir.tif", "nir.tiff", "*B08.tif", "*B08.tiff"),
+}
+
+# (lower bound of mean NDVI, health status, recommendations)
+HEALTH_CLASSES = [
+    (0.6, "Excellent", [
+        "Dense, vigorous canopy across the field",
+        "Keep the current irrigation and fertilizer schedule",
+    ]),
+    (0.4, "Good", [
+        "Healthy vegetation with some variation across the field",
+        "Scout the lower-NDVI patches for pests or water stress",
+    ]),
+    (0.2, "Needs Attention", [
+        "Sparse or stressed vegetation",
+        "Monitor soil moisture levels",
+        "Check for pest infestations",
+        "Consider fertilizer application",
+    ]),
+    (-1.0, "Poor", [
+        "Little active vegetation: bare soil, water, or a crop under severe stress",
+        "Inspect the field and check irrigation and drainage",
+    ]),
+]
+
+CIRCLE_VERTICES = 64
+EARTH_RADIUS_M = 6371008.8
+
+
+class NdviError(Exception):
+    pass
+
+
+class NoSceneCoverage(NdviError):
+    pass
+
+
+class InvalidPolygon(NdviError, ValueError):
+    pass
+
+
+def health_class(ndvi: float) -> Tuple[str, List[str]]:
+    for lower, status, recommendations in HEALTH_CLASSES:
+        if ndvi >= lower:
+            return status, recommendations
+    return HEALTH_CLASSES[-1][1], HEALTH_CLASSES[-1][2]
+
+
+def _coordinate(value, low: float, high: float) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise InvalidPolygon(f"Polygon coordinate {value!r} is not a number between {low:g} and {high:g}")
+    return float(value)
+
+
+def parse_polygon(polygon_coords) -> Optional[List[Tuple[float, float]]]:
+    """(lng, lat) vertices from a farm's ``polygon_coords`` (JSON text or list of
+    ``{"lat": .., "lng": ..}``), or None if there is no usable polygon.
+
+    Raises InvalidPolygon if a point is not a pair of numeric coordinates."""
+    if not polygon_coords:
+        return None
+    try:
+        points = json.loads(polygon_coords) if isinstance(polygon_coords, str) else polygon_coords
+    except ValueError as e:
+        raise InvalidPolygon(f"Polygon is not valid JSON: {e}")
+    if not isinstance(points, (list, tuple)):
+        raise InvalidPolygon("Polygon must be a list of points")
+    vertices = []
+    for point in points:
+        if isinstance(point, dict):
+            lng, lat = point.get("lng", point.get("lon")), point.get("lat")
+        elif isinstance(point, (list, tuple)) and len(point) == 2:
+            lng, lat = point
+        else:
+            raise InvalidPolygon(f"Polygon point {point!r} is not a lat/lng pair")
+        vertices.append((_coordinate(lng, -180, 180), _coordinate(lat, -90, 90)))
+    return vertices if len(vertices) >= 3 else None
+
+
+def circle_polygon(lat: float, lng: float, radius_m: float) -> List[Tuple[float, float]]:
+    """(lng, lat) vertices of a circle of ``radius_m`` around a point."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    angles = np.linspace(0, 2 * math.pi, CIRCLE_VERTICES, endpoint=False)
+    return list(zip(lng + dlng * np.cos(angles), lat + dlat * np.sin(angles)))
+
+
+def farm_vertices(polygon_coords, lat: float, lng: float, radius_m: float) -> List[Tuple[float, float]]:
+    """A farm's drawn boundary, or a circle of ``radius_m`` around its pin."""
+    return parse_polygon(polygon_coords) or circle_polygon(lat, lng, radius_m)
+
+
+def bounding_box(vertices: List[Tuple[float, float]]) -> Tuple[float, float, float, float]:
+    """(left, bottom, right, top) of (lng, lat) vertices."""
+    lngs, lats = zip(*vertices)
+    return min(lngs), min(lats), max(lngs), max(lats)
+
+
+def polygon_mask(rows: np.ndarray, cols: np.ndarray, shape: Tuple[int, int], origin: Tuple[int, int]) -> np.ndarray:
+    """Boolean mask of the pixels in a window whose centres fall inside a polygon.
+
+    ``rows``/``cols`` are the polygon vertices in fractional pixel coordinates of
+    the full raster; ``origin`` is the window's top-left (row, col). Even-odd
+    rule, vectorized over the window's pixels one edge at a time.
+    """
+    height, width = shape
+    y = (np.arange(height) + origin[0] + 0.5)[:, None]
+    x = (np.arange(width) + origin[1] + 0.5)[None, :]
+    inside = np.zeros(shape, dtype=bool)
+    count = len(rows)
+    for i in range(count):
+        y1, x1 = rows[i], cols[i]
+        y2, x2 = rows[(i + 1) % count], cols[(i + 1) % count]
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        x_at_y = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < x_at_y)
+    return inside
+
+
+class _RasterioBand:
+    def __init__(self, path: str):
+        import rasterio
+        from rasterio.warp import transform_bounds
+
+        self._rasterio = rasterio
+        self.dataset = rasterio.open(path)
+        self.shape = (self.dataset.height, self.dataset.width)
+        self.nodata = self.dataset.nodata
+        self.geographic = self.dataset.crs is None or self.dataset.crs.to_epsg() == 4326
+        if self.geographic:
+            left, bottom, right, top = self.dataset.bounds
+        else:
+            left, bottom, right, top = transform_bounds(self.dataset.crs, "EPSG:4326", *self.dataset.bounds)
+        self.bounds = (left, bottom, right, top)
+        self._inverse = ~self.dataset.transform
+        self._lock = threading.Lock()
+
+    def to_pixel(self, lngs: Sequence[float], lats: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        xs, ys = list(lngs), list(lats)
+        if not self.geographic:
+            from rasterio.warp import transform
+            xs, ys = transform("EPSG:4326", self.dataset.crs, xs, ys)
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        inverse = self._inverse
+        cols = inverse.a * xs + inverse.b * ys + inverse.c
+        rows = inverse.d * xs + inverse.e * ys + inverse.f
+        return rows, cols
+
+    def read(self, row0: int, row1: int, col0: int, col1: int) -> np.ndarray:
+        from rasterio.windows import Window
+        with self._lock:
+            return self.dataset.read(1, window=Window(col0, row0, col1 - col0, row1 - row0))
+
+    def close(self):
+        self.dataset.close()
+
+
+class _TiffBand:
+    PROJECTED_CS_KEY = 3072
+
+    def __init__(self, path: str):
+        import tifffile
+
+        self.tif = tifffile.TiffFile(path)
+        self.page = self.tif.pages[0]
+        if self.page.samplesperpixel != 1:
+            raise NdviError(f"{path}: expected a single-band raster")
+        tags = self.page.tags
+        geokeys = tags.get("GeoKeyDirectoryTag")
+        if geokeys is not None and self.PROJECTED_CS_KEY in geokeys.value[4::4]:
+            raise NdviError(f"{path}: projected rasters need rasterio")
+        scale, tiepoint = tags.get("ModelPixelScaleTag"), tags.get("ModelTiepointTag")
+        if scale is None or tiepoint is None:
+            raise NdviError(f"{path}: not georeferenced")
+        self.pixel_width, self.pixel_height = scale.value[0], scale.value[1]
+        self.origin_col, self.origin_row, _, self.origin_x, self.origin_y = tiepoint.value[:5]
+
+        self.shape = (self.page.imagelength, self.page.imagewidth)
+        nodata = tags.get("GDAL_NODATA")
+        self.nodata = float(nodata.value.strip("\x00")) if nodata is not None else None
+        left = self.origin_x - self.origin_col * self.pixel_width
+        top = self.origin_y + self.origin_row * self.pixel_height
+        self.bounds = (left, top - self.shape[0] * self.pixel_height, left + self.shape[1] * self.pixel_width, top)
+
+        self._memmap = None
+        if self.page.is_contiguous and not self.page.is_tiled:
+            try:
+                self._memmap = tifffile.memmap(path, mode="r")
+            except ValueError:
+                self._memmap = None
+        self._lock = threading.Lock()
+
+    def to_pixel(self, lngs: Sequence[float], lats: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        cols = self.origin_col + (np.asarray(lngs) - self.origin_x) / self.pixel_width
+        rows = self.origin_row + (self.origin_y - np.asarray(lats)) / self.pixel_height
+        return rows, cols
+
+    def read(self, row0: int, row1: int, col0: int, col1: int) -> np.ndarray:
+        if self._memmap is not None:
+            return np.array(self._memmap[row0:row1, col0:col1])
+
+        page = self.page
+        if page.is_tiled:
+            segment_height, segment_width = page.tilelength, page.tilewidth
+        else:
+            segment_height, segment_width = page.rowsperstrip, page.imagewidth
+        per_row = -(-page.imagewidth // segment_width)
+        out = np.zeros((row1 - row0, col1 - col0), dtype=page.dtype)
+
+        for segment_row in range(row0 // segment_height, (row1 - 1) // segment_height + 1):
+            for segment_col in range(col0 // segment_width, (col1 - 1) // segment_width + 1):
+                index = segment_row * per_row + segment_col
+                with self._lock:
+                    self.tif.filehandle.seek(page.dataoffsets[index])
+                    data = self.tif.filehandle.read(page.databytecounts[index])
+                segment, _, shape = page.decode(data, index, jpegtables=page.jpegtables)
+                segment = segment.reshape(shape)[0, :, :, 0]
+
+                top, left = segment_row * segment_height, segment_col * segment_width
+                r0, r1 = max(row0, top), min(row1, top + segment.shape[0])
+                c0, c1 = max(col0, left), min(col1, left + segment.shape[1])
+                if r0 < r1 and c0 < c1:
+                    out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = segment[r0 - top:r1 - top, c0 - left:c1 - left]
+        return out
+
+    def close(self):
+        self._memmap = None
+        self.tif.close()
+
+
+def open_band(path: str):
+    try:
+        import rasterio  # noqa: F401
+    except ImportError:
+        return _TiffBand(path)
+    return _RasterioBand(path)
+
+
+@dataclass
+class Scene:
+    scene_id: str
+    directory: str
+    acquired: datetime
+    red: object
+    nir: object
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return self.red.bounds
+
+    def covers(self, vertices: List[Tuple[float, float]]) -> bool:
+        left, bottom, right, top = self.bounds
+        return all(left <= lng <= right and bottom <= lat <= top for lng, lat in vertices)
+
+    def intersects(self, vertices: List[Tuple[float, float]]) -> bool:
+        """Whether the polygon's bounding box overlaps the scene at all."""
+        left, bottom, right, top = self.bounds
+        min_lng, min_lat, max_lng, max_lat = bounding_box(vertices)
+        return min_lng <= right and max_lng >= left and min_lat <= top and max_lat >= bottom
+
+    def close(self):
+        self.red.close()
+        self.nir.close()
+
+
+def _find_band(directory: str, patterns: Sequence[str]) -> Optional[str]:
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.join(directory, pattern)))
+        if matches:
+            return matches[0]
+    return None
+
+
+def _acquired(directory: str, band_path: str) -> datetime:
+    metadata_path = os.path.join(directory, "scene.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, encoding="utf-8") as f:
+            acquired = json.load(f).get("acquired")
+        if acquired:
+            parsed = datetime.fromisoformat(acquired.replace("Z", "+00:00"))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+    return datetime.utcfromtimestamp(os.path.getmtime(band_path))
+
+
+def open_scene(directory: str) -> Optional[Scene]:
+    red_path = _find_band(directory, BAND_PATTERNS["red"])
+    nir_path = _find_band(directory, BAND_PATTERNS["nir"])
+    if red_path is None or nir_path is None:
+        return None
+    red, nir = open_band(red_path), open_band(nir_path)
+    if red.shape != nir.shape or not np.allclose(red.bounds, nir.bounds):
+        red.close()
+        nir.close()
+        raise NdviError(f"{directory}: red and NIR bands are on different grids")
+    return Scene(os.path.basename(os.path.normpath(directory)), directory, _acquired(directory, red_path), red, nir)
+
+
+class SceneCatalog:
+    """The scenes under a directory, newest first. Band files stay open (and
+    memory mapped where possible) for the catalog's lifetime.
+
+    ``reload`` opens only directories it has not seen before and swaps in a
+    fresh list. Scenes whose directory disappeared are closed on the reload
+    after the one that dropped them, so requests still reading them finish.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.scenes: List[Scene] = []
+        self._retired: List[Scene] = []
+        self.reload()
+
+    def reload(self):
+        for scene in self._retired:
+            scene.close()
+        known = {scene.directory: scene for scene in self.scenes}
+        scenes = []
+        for directory in sorted(glob.glob(os.path.join(self.root, "*"))):
+            if not os.path.isdir(directory):
+                continue
+            if directory in known:
+                scenes.append(known[directory])
+                continue
+            try:
+                scene = open_scene(directory)
+            except Exception as e:
+                logger.warning(f"Skipping NDVI scene {directory}: {e}")
+                continue
+            if scene is not None:
+                scenes.append(scene)
+        scenes.sort(key=lambda scene: scene.acquired, reverse=True)
+        listed = {scene.directory for scene in scenes}
+        if set(known) != listed:
+            logger.info(f"Loaded {len(scenes)} NDVI scenes from {self.root}")
+        self._retired = [scene for directory, scene in known.items() if directory not in listed]
+        self.scenes = scenes
+
+    def covering(self, vertices: List[Tuple[float, float]]) -> List[Scene]:
+        return [scene for scene in self.scenes if scene.covers(vertices)]
+
+    def intersecting(self, vertices: List[Tuple[float, float]]) -> List[Scene]:
+        return [scene for scene in self.scenes if scene.intersects(vertices)]
+
+    def close(self):
+        for scene in self.scenes + self._retired:
+            scene.close()
+        self.scenes = []
+        self._retired = []
+
+
+def scene_ndvi(scene: Scene, vertices: List[Tuple[float, float]], max_pixels: int = 25_000_000) -> Dict:
+    """NDVI statistics over the pixels of ``scene`` inside the (lng, lat) polygon."""
+    lngs, lats = zip(*vertices)
+    rows, cols = scene.red.to_pixel(lngs, lats)
+    height, width = scene.red.shape
+    row0, row1 = max(int(math.floor(rows.min())), 0), min(int(math.ceil(rows.max())), height)
+    col0, col1 = max(int(math.floor(cols.min())), 0), min(int(math.ceil(cols.max())), width)
+    if row0 >= row1 or col0 >= col1:
+        raise NoSceneCoverage(f"Area lies outside scene {scene.scene_id}")
+    if (row1 - row0) * (col1 - col0) > max_pixels:
+        raise NdviError("Area too large for NDVI analysis")
+
+    red = scene.red.read(row0, row1, col0, col1).astype(np.float32)
+    nir = scene.nir.read(row0, row1, col0, col1).astype(np.float32)
+    mask = polygon_mask(rows, cols, red.shape, (row0, col0))
+    if not mask.any():
+        # Area smaller than a pixel (or only grazing the scene's edge): use the pixel nearest its centre
+        row = min(max(int(rows.mean() - row0), 0), red.shape[0] - 1)
+        col = min(max(int(cols.mean() - col0), 0), red.shape[1] - 1)
+        mask[row, col] = True
+
+    total = nir + red
+    valid = mask & (total > 0)
+    if scene.red.nodata is not None:
+        valid &= red != scene.red.nodata
+    if scene.nir.nodata is not None:
+        valid &= nir != scene.nir.nodata
+    if not valid.any():
+        raise NdviError(f"No valid pixels for this area in scene {scene.scene_id}")
+
+    values = (nir[valid] - red[valid]) / total[valid]
+    p10, median, p90 = np.percentile(values, [10, 50, 90])
+    mean = float(values.mean())
+    status, _ = health_class(mean)
+    return {
+        "scene_id": scene.scene_id,
+        "acquired": scene.acquired.isoformat(),
+        "pixels": int(values.size),
+        "mean": round(mean, 4),
+        "median": round(float(median), 4),
+        "p10": round(float(p10), 4),
+        "p90": round(float(p90), 4),
+        "std": round(float(values.std()), 4),
+        "min": round(float(values.min()), 4),
+        "max": round(float(values.max()), 4),
+        "health_status": status,
+    }
+
+
+def latest_ndvi(catalog: SceneCatalog, vertices: List[Tuple[float, float]], max_pixels: int = 25_000_000) -> Dict:
+    scenes = catalog.covering(vertices)
+    if not scenes:
+        raise NoSceneCoverage("No NDVI scene covers this location")
+    return scene_ndvi(scenes[0], vertices, max_pixels)
+
+
+def write_synthetic_scene(
+    directory: str,
+    bounds: Tuple[float, float, float, float],
+    size: Tuple[int, int] = (2048, 2048),
+    acquired: Optional[datetime] = None,
+    seed: int = 0,
+    tile: Optional[int] = 256,
+    compression: Optional[str] = "zlib",
+    vigor: float = 1.0,
+):
+    """Write a fake red/NIR scene in EPSG:4326 over ``bounds`` (left, bottom, right, top).
+
+    Fields of varying vigour on bare soil, as uint16 reflectance x 10000 like
+    Sentinel-2 L2A. ``vigor`` scales the vegetation, so successive scenes of a
+    time series can green up or dry out.
+    """
+    import tifffile
+
+    height, width = size
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    # Smooth vegetation fraction: a few Gaussian fields on bare soil
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    vegetation = np.zeros((height, width), dtype=np.float32)
+    for _ in range(12):
+        cy, cx, radius = rng.uniform(0, 1), rng.uniform(0, 1), rng.uniform(0.05, 0.25)
+        vegetation = np.maximum(vegetation, rng.uniform(0.4, 1.0) * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius ** 2)))
+    vegetation = np.clip(vegetation * vigor + rng.normal(0, 0.03, (height, width)), 0, 1)
+
+    red = (1800 - 1400 * vegetation).astype(np.uint16)  # soil ~0.18, canopy ~0.04
+    nir = (2500 + 2500 * vegetation).astype(np.uint16)  # soil ~0.25, canopy ~0.50
+
+    left, bottom, right, top = bounds
+    extratags = [
+        (33550, "d", 3, ((right - left) / width, (top - bottom) / height, 0.0), True),  # ModelPixelScale
+        (33922, "d", 6, (0.0, 0.0, 0.0, left, top, 0.0), True),  # ModelTiepoint
+        # GeoKeyDirectory: geographic model, pixel-is-area, EPSG:4326
+        (34735, "H", 16, (1, 1, 0, 3, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326), True),
+    ]
+    options = {"extratags": extratags, "compression": compression}
+    if tile:
+        options["tile"] = (tile, tile)
+    tifffile.imwrite(os.path.join(directory, "red.tif"), red, **options)
+    tifffile.imwrite(os.path.join(directory, "nir.tif"), nir, **options)
+    with open(os.path.join(directory, "scene.json"), "w", encoding="utf-8") as f:
+        json.dump({"acquired": (acquired or datetime.utcnow()).isoformat()}, f)
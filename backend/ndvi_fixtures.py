@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Write synthetic red/NIR scenes for NDVI development and offline testing.
+
+The scenes cover Sri Lanka, so the demo farms on the map all fall inside
+them. Successive acquisitions are 16 days apart (Sentinel-2's revisit is
+5 days; the gap just makes trends visible) and green up then dry out.
+
+    cd backend
+    python ndvi_fixtures.py --out ndvi_scenes --scenes 4
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from ndvi import write_synthetic_scene
+
+SRI_LANKA_BOUNDS = (79.5, 5.9, 81.9, 9.9)  # left, bottom, right, top
+VIGOR_CYCLE = (0.6, 0.85, 1.0, 0.9, 0.7, 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.getenv("NDVI_SCENES_DIR", "ndvi_scenes"))
+    parser.add_argument("--scenes", type=int, default=3)
+    parser.add_argument("--size", type=int, default=4096, help="pixels per side")
+    parser.add_argument("--uncompressed", action="store_true", help="write plain rasters that can be memory mapped")
+    args = parser.parse_args()
+
+    start = datetime.utcnow().replace(hour=5, minute=0, second=0, microsecond=0) - timedelta(days=16 * (args.scenes - 1))
+    for index in range(args.scenes):
+        acquired = start + timedelta(days=16 * index)
+        directory = os.path.join(args.out, f"synthetic_{acquired:%Y%m%d}")
+        write_synthetic_scene(
+            directory,
+            SRI_LANKA_BOUNDS,
+            size=(args.size, args.size),
+            acquired=acquired,
+            seed=7,
+            tile=None if args.uncompressed else 256,
+            compression=None if args.uncompressed else "zlib",
+            vigor=VIGOR_CYCLE[index % len(VIGOR_CYCLE)],
+        )
+        print(f"Wrote {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Background NDVI time series: every scene is processed once, for the farms it overlaps.
+
+Each farm's bounding box is kept in ``FarmExtent``, and the cells of a
+fixed lat/lng grid (``grid_degrees`` wide) that the box touches in
+``FarmExtentCell``, keyed by cell. When a new scene appears in the catalog,
+the farms are looked up through the cells under the scene, one key range per
+grid row, and only those whose box overlaps the scene are measured, so a
+scene costs roughly the farms near it rather than a scan of the farm table.
+A farm on a tile edge is measured over the part each tile covers, so it gets
+an observation from every one. The per-farm statistics are appended to ``FarmNdviObservation`` and the scene
+is recorded in ``ProcessedScene`` so it is never measured again.
+
+A scene is claimed by inserting its ``ProcessedScene`` row, so only one
+server process measures it. A claim records its owner and time; one left
+running past ``claim_lease`` seconds belongs to a process that died and is
+released for another pass to take. Claims younger than that are never
+touched, so the lease must exceed the time a scene takes to measure.
+
+Scenes are measured in a process pool. A backfill of many scenes fans out
+across the workers while the database writes stay in this process. A farm
+added after its scenes were processed is measured against them once, the
+next time the pipeline runs.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import socket
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ndvi import NdviError, SceneCatalog, bounding_box, farm_vertices, open_scene, scene_ndvi
+
+logger = logging.getLogger(__name__)
+
+OBSERVATION_FIELDS = ("mean", "median", "p10", "p90", "std", "pixels")
+
+
+def measure_farms(directory: str, farms: List[Tuple[int, list]], max_pixels: int) -> List[Tuple[int, dict]]:
+    """Runs in a worker process: NDVI statistics of each (farm_id, vertices) in one
+    scene, over the part of the farm the scene covers."""
+    scene = open_scene(directory)
+    if scene is None:
+        raise NdviError(f"{directory}: red or NIR band missing")
+    results = []
+    try:
+        for farm_id, vertices in farms:
+            try:
+                results.append((farm_id, scene_ndvi(scene, vertices, max_pixels)))
+            except NdviError as e:
+                # Clouds/nodata over the farm, or an area too large: no observation from this scene
+                logger.debug(f"Farm {farm_id} skipped in {scene.scene_id}: {e}")
+    finally:
+        scene.close()
+    return results
+
+
+def _grid_index(value: float, origin: float, degrees: float, count: int) -> int:
+    return min(max(int(math.floor((value - origin) / degrees)), 0), count - 1)
+
+
+def grid_ranges(bounds, degrees: float) -> List[Tuple[int, int]]:
+    """Inclusive (first, last) keys of the grid cells a (left, bottom, right, top)
+    box touches, one range per grid row."""
+    left, bottom, right, top = bounds
+    columns, rows = math.ceil(360 / degrees), math.ceil(180 / degrees)
+    col0, col1 = _grid_index(left, -180, degrees, columns), _grid_index(right, -180, degrees, columns)
+    row0, row1 = _grid_index(bottom, -90, degrees, rows), _grid_index(top, -90, degrees, rows)
+    return [(row * columns + col0, row * columns + col1) for row in range(row0, row1 + 1)]
+
+
+def grid_cells(bounds, degrees: float) -> List[int]:
+    return [cell for first, last in grid_ranges(bounds, degrees) for cell in range(first, last + 1)]
+
+
+class NdviPipeline:
+    def __init__(
+        self,
+        catalog: SceneCatalog,
+        session_factory,
+        farm_model,
+        extent_model,
+        cell_model,
+        scene_model,
+        observation_model,
+        default_radius_m: float = 100,
+        max_pixels: int = 25_000_000,
+        workers: Optional[int] = None,
+        interval: float = 300,
+        claim_lease: float = 3600,
+        grid_degrees: float = 0.1,
+    ):
+        self.catalog = catalog
+        self.session_factory = session_factory
+        self.farm_model = farm_model
+        self.extent_model = extent_model
+        self.cell_model = cell_model
+        self.scene_model = scene_model
+        self.observation_model = observation_model
+        self.default_radius_m = default_radius_m
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self.interval = interval
+        self.claim_lease = timedelta(seconds=claim_lease)
+        self.grid_degrees = grid_degrees
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def wake(self):
+        """Run a pass now, e.g. after a farm was added."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def extent_row(self, farm_id: int, vertices: list) -> dict:
+        left, bottom, right, top = bounding_box(vertices)
+        return {"farm_id": farm_id, "min_lng": left, "min_lat": bottom, "max_lng": right, "max_lat": top, "backfilled": False}
+
+    def cell_rows(self, farm_id: int, bounds) -> List[dict]:
+        return [{"cell": cell, "farm_id": farm_id} for cell in grid_cells(bounds, self.grid_degrees)]
+
+    def extent_records(self, farm_id: int, vertices: list) -> list:
+        """FarmExtent and FarmExtentCell rows registering a new farm with the pipeline."""
+        extent = self.extent_row(farm_id, vertices)
+        bounds = (extent["min_lng"], extent["min_lat"], extent["max_lng"], extent["max_lat"])
+        return [self.extent_model(**extent)] + [self.cell_model(**row) for row in self.cell_rows(farm_id, bounds)]
+
+    async def _run(self):
+        await asyncio.to_thread(self._release_claims, True)
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"NDVI pipeline pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self):
+        await asyncio.to_thread(self.catalog.reload)
+        await asyncio.to_thread(self._sync_extents)
+        await asyncio.to_thread(self._release_claims, False)
+
+        # New scenes: each measured once for the farms overlapping it, all scenes in parallel
+        claimed = await asyncio.to_thread(self._claim_new_scenes)
+        if claimed:
+            started = datetime.utcnow()
+            await asyncio.gather(*(self._process_scene(scene) for scene in claimed))
+            logger.info(f"Processed {len(claimed)} NDVI scenes in {(datetime.utcnow() - started).total_seconds():.1f}s")
+
+        # New farms: measured against the scenes processed before they existed
+        for farm_id, vertices in await asyncio.to_thread(self._pending_farms):
+            await self._backfill_farm(farm_id, vertices)
+
+    # Scenes
+
+    def _release_claims(self, retry_failed: bool):
+        """Release scenes whose claim outlived the lease (their process died
+        mid-run) and, at startup, the ones that failed so they are retried."""
+        model = self.scene_model
+        stale = and_(
+            model.status == "running",
+            or_(model.claimed_at.is_(None), model.claimed_at < datetime.utcnow() - self.claim_lease),
+        )
+        with self.session_factory() as db:
+            released = db.execute(
+                delete(model).where(or_(stale, model.status == "failed") if retry_failed else stale)
+            ).rowcount
+            db.commit()
+        if released:
+            logger.info(f"Released {released} NDVI scene claims for reprocessing")
+
+    def _claim_new_scenes(self) -> list:
+        model = self.scene_model
+        with self.session_factory() as db:
+            processed = set(db.scalars(select(model.scene_id)))
+        claimed = []
+        # Oldest first, so a series grows in order during a backfill
+        for scene in reversed(self.catalog.scenes):
+            if scene.scene_id in processed:
+                continue
+            with self.session_factory() as db:
+                db.add(model(
+                    scene_id=scene.scene_id, acquired=scene.acquired, status="running", farms=0,
+                    owner=self.owner, claimed_at=datetime.utcnow(),
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    continue  # another server process took it
+            claimed.append(scene)
+        return claimed
+
+    async def _process_scene(self, scene):
+        try:
+            farms = await asyncio.to_thread(self._farms_in, scene.bounds)
+            results = await self._measure(scene.directory, farms) if farms else []
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"NDVI scene {scene.scene_id} failed: {e}")
+            await asyncio.to_thread(self._finish_scene, scene, "failed", [], str(e))
+            return
+        await asyncio.to_thread(self._finish_scene, scene, "done", results, None)
+
+    async def _measure(self, directory: str, farms: list) -> list:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, measure_farms, directory, farms, self.max_pixels)
+
+    def _farm_area(self, farm) -> list:
+        return farm_vertices(farm.polygon_coords, farm.location_lat, farm.location_lng, self.default_radius_m)
+
+    def _farm_areas(self, farms) -> List[Tuple[int, list]]:
+        # A farm with a broken location is logged and left out, never the whole pass
+        areas = []
+        for farm in farms:
+            try:
+                areas.append((farm.id, self._farm_area(farm)))
+            except Exception as e:
+                logger.warning(f"Farm {farm.id} has no usable location for NDVI: {e!r}")
+        return areas
+
+    def _farms_in(self, bounds) -> List[Tuple[int, list]]:
+        left, bottom, right, top = bounds
+        extent, cell, farm = self.extent_model, self.cell_model, self.farm_model
+        nearby = select(cell.farm_id).where(
+            or_(*(cell.cell.between(first, last) for first, last in grid_ranges(bounds, self.grid_degrees)))
+        )
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(farm)
+                .join(extent, extent.farm_id == farm.id)
+                .where(
+                    extent.farm_id.in_(nearby),
+                    extent.min_lng <= right, extent.max_lng >= left,
+                    extent.min_lat <= top, extent.max_lat >= bottom,
+                )
+            ).scalars().all()
+            return self._farm_areas(rows)
+
+    def _finish_scene(self, scene, status: str, results: list, error: Optional[str]):
+        with self.session_factory() as db:
+            self._store(db, scene, results)
+            db.execute(
+                update(self.scene_model)
+                .where(self.scene_model.scene_id == scene.scene_id)
+                .values(status=status, farms=len(results), error=error, processed_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def _store(self, db, scene, results: list):
+        if not results:
+            return
+        model = self.observation_model
+        db.execute(delete(model).where(
+            model.scene_id == scene.scene_id, model.farm_id.in_([farm_id for farm_id, _ in results])
+        ))
+        db.execute(insert(model), [
+            {"farm_id": farm_id, "scene_id": scene.scene_id, "acquired": scene.acquired,
+             **{field: stats[field] for field in OBSERVATION_FIELDS}}
+            for farm_id, stats in results
+        ])
+
+    # Farms
+
+    def _sync_extents(self):
+        """Add extents for farms created before the pipeline existed (or by other
+        tools), and grid cells for extents that have none."""
+        extent, cell, farm = self.extent_model, self.cell_model, self.farm_model
+        with self.session_factory() as db:
+            missing = db.execute(
+                select(farm).outerjoin(extent, extent.farm_id == farm.id).where(extent.farm_id.is_(None))
+            ).scalars().all()
+            rows = []
+            for farm_id, vertices in self._farm_areas(missing):
+                try:
+                    rows.append(self.extent_row(farm_id, vertices))
+                except Exception as e:
+                    logger.warning(f"Farm {farm_id} has no usable location for NDVI: {e!r}")
+            if rows:
+                db.execute(insert(extent), rows)
+
+            uncelled = db.execute(
+                select(extent).outerjoin(cell, cell.farm_id == extent.farm_id).where(cell.farm_id.is_(None))
+            ).scalars().all()
+            cells = [
+                cell_row
+                for row in uncelled
+                for cell_row in self.cell_rows(row.farm_id, (row.min_lng, row.min_lat, row.max_lng, row.max_lat))
+            ]
+            if cells:
+                db.execute(insert(cell), cells)
+            if rows or cells:
+                db.commit()
+
+    def _pending_farms(self) -> List[Tuple[int, list]]:
+        extent, farm = self.extent_model, self.farm_model
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(farm).join(extent, extent.farm_id == farm.id).where(extent.backfilled.is_(False))
+            ).scalars().all()
+            return self._farm_areas(rows)
+
+    def _done_scene_ids(self) -> set:
+        model = self.scene_model
+        with self.session_factory() as db:
+            return set(db.scalars(select(model.scene_id).where(model.status == "done")))
+
+    async def _backfill_farm(self, farm_id: int, vertices: list):
+        processed = await asyncio.to_thread(self._done_scene_ids)
+        scenes = [scene for scene in self.catalog.intersecting(vertices) if scene.scene_id in processed]
+
+        outcomes = await asyncio.gather(
+            *(self._measure(scene.directory, [(farm_id, vertices)]) for scene in scenes), return_exceptions=True
+        )
+        measured = []
+        for scene, outcome in zip(scenes, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                # An unreadable scene must not keep this farm (and every farm after it) pending
+                logger.warning(f"NDVI backfill of farm {farm_id} skipped scene {scene.scene_id}: {outcome}")
+                continue
+            measured.append((scene, outcome))
+        await asyncio.to_thread(self._finish_farm, farm_id, measured)
+        if measured:
+            logger.info(f"Backfilled NDVI for farm {farm_id} from {len(measured)} scenes")
+
+    def _finish_farm(self, farm_id: int, measured: list):
+        with self.session_factory() as db:
+            for scene, results in measured:
+                self._store(db, scene, results)
+            db.execute(
+                update(self.extent_model).where(self.extent_model.farm_id == farm_id).values(backfilled=True)
+            )
+            db.commit()
@@ -0,0 +1,59 @@
+"""
+Keyset (cursor) pagination over time-ordered tables.
+
+Pages are ordered newest first by (timestamp, id). The cursor encodes the
+last row of a page, so fetching page N costs the same as fetching page 1
+when a matching composite index exists.
+"""
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def keyset_page(
+    db,
+    stmt,
+    time_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> dict:
+    """Run ``stmt`` (a Core select of plain columns) one page at a time on an AsyncSession."""
+    if since is not None:
+        stmt = stmt.where(time_column >= since)
+    if until is not None:
+        stmt = stmt.where(time_column < until)
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(time_column, id_column) < (timestamp, row_id))
+
+    stmt = stmt.order_by(time_column.desc(), id_column.desc()).limit(limit + 1)
+    rows: List[dict] = [dict(row._mapping) for row in await db.execute(stmt)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[time_column.key], last[id_column.key])
+
+    return {"items": rows, "next_cursor": next_cursor}
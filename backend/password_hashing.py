@@ -0,0 +1,104 @@
+"""
+PBKDF2-SHA256 password hashing on a dedicated process pool.
+
+Hashes are stored as ``pbkdf2_sha256$<iterations>$<salt>$<hex digest>`` so the
+work factor can be raised without invalidating existing passwords; a
+successful login reports when the stored hash is below the current setting
+and should be replaced. Hashes from before the prefix was introduced
+(``<salt>$<hex digest>``) are read as 100,000 iterations.
+
+The pool is sized separately from the request threadpool and refuses new
+work with ``HashingBusy`` once ``max_pending`` hashes are queued, so a login
+spike is shed instead of starving unrelated endpoints.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+ALGORITHM = "pbkdf2_sha256"
+LEGACY_ITERATIONS = 100000
+MIN_ITERATIONS = 100000
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
+
+
+def hash_password(password: str, iterations: int = MIN_ITERATIONS) -> str:
+    salt = secrets.token_hex(16)
+    return f"{ALGORITHM}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def parse_hash(hashed_password: str) -> Tuple[int, str, str]:
+    """(iterations, salt, digest) of a stored hash, in either format."""
+    parts = hashed_password.split('$')
+    if len(parts) == 2:
+        return LEGACY_ITERATIONS, parts[0], parts[1]
+    if len(parts) == 4 and parts[0] == ALGORITHM:
+        return int(parts[1]), parts[2], parts[3]
+    raise ValueError("Unrecognized password hash format")
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    iterations, salt, digest = parse_hash(hashed_password)
+    return hmac.compare_digest(_pbkdf2(password, salt, iterations), digest)
+
+
+def needs_rehash(hashed_password: str, iterations: int) -> bool:
+    return not hashed_password.startswith(f"{ALGORITHM}$") or parse_hash(hashed_password)[0] < iterations
+
+
+def calibrate_iterations(target_ms: float, minimum: int = MIN_ITERATIONS) -> int:
+    """Iteration count that takes about ``target_ms`` on this machine."""
+    sample = 20000
+    started = time.perf_counter()
+    _pbkdf2("calibration", "salt", sample)
+    per_iteration = (time.perf_counter() - started) / sample
+    return max(minimum, int(target_ms / 1000 / per_iteration) // 1000 * 1000)
+
+
+class PasswordHasher:
+    def __init__(self, iterations: int = MIN_ITERATIONS, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.iterations = iterations
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 8
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise HashingBusy()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.iterations)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, bool]:
+        """(matches, should be rehashed with the current iteration count)."""
+        matches = await self._run(verify_password, password, hashed_password)
+        return matches, matches and needs_rehash(hashed_password, self.iterations)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,234 @@
+"""
+Local BM25 retrieval over the crop guide pages and plant tips.
+
+Each ``<section>`` of a page in frontend/plants becomes one passage, titled
+"<crop> - <section heading>", and every plant tip becomes another. Passages
+are indexed into an in-memory inverted index scored with BM25. The index is
+written to disk together with a hash of its sources and reused on the next
+start as long as the sources are unchanged.
+
+``coverage`` reports how much of a query's IDF weight the best passage
+covers and ``matched_terms`` how many of the query's terms it contains,
+which the chatbot uses to decide between answering from the index and
+asking Gemini with the passages as context.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+from dataclasses import asdict, dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from chat_cache import tokenize
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Passage:
+    title: str
+    text: str
+    source: str
+
+
+class _PlantPageParser(HTMLParser):
+    """Collects (crop, section heading, text) from a crop guide page."""
+
+    def __init__(self):
+        super().__init__()
+        self.crop = ""
+        self.sections: List[Tuple[str, List[str]]] = []
+        self._tag_stack: List[str] = []
+        self._in_section = False
+
+    def handle_starttag(self, tag, attrs):
+        self._tag_stack.append(tag)
+        if tag == "section":
+            self._in_section = True
+            self.sections.append(("", []))
+
+    def handle_endtag(self, tag):
+        while self._tag_stack:
+            if self._tag_stack.pop() == tag:
+                break
+        if tag == "section":
+            self._in_section = False
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if not text or not self._tag_stack:
+            return
+        tag = self._tag_stack[-1]
+        if tag == "h1":
+            self.crop = text
+        elif self._in_section and tag == "h2":
+            self.sections[-1] = (text, self.sections[-1][1])
+        elif self._in_section and tag in ("li", "p"):
+            self.sections[-1][1].append(text if text.endswith(".") else text + ".")
+
+
+def load_plant_pages(directory: str) -> List[Passage]:
+    passages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        parser = _PlantPageParser()
+        with open(path, encoding="utf-8") as f:
+            parser.feed(f.read())
+        for heading, lines in parser.sections:
+            if lines:
+                passages.append(Passage(
+                    title=f"{parser.crop} - {heading}" if heading else parser.crop,
+                    text=" ".join(lines),
+                    source=f"plants/{os.path.basename(path)}",
+                ))
+    return passages
+
+
+def tip_passages(tips: Dict[str, List[dict]]) -> List[Passage]:
+    return [
+        Passage(
+            title=tip["title"] if crop == "general" else f"{crop.title()} - {tip['title']}",
+            text=tip["tip"],
+            source=f"plant-tips/{crop}",
+        )
+        for crop, crop_tips in tips.items()
+        for tip in crop_tips
+    ]
+
+
+# Words that carry no topic in a farmer's question. The answer cache keeps
+# interrogatives in its keys; they say nothing about which passage to pick.
+QUERY_FILLER = {
+    "much", "many", "need", "needs", "best", "good", "way", "long", "take", "help", "know", "time", "get",
+    "how", "what", "when", "where", "which", "why",
+}
+
+
+def _stem(word: str) -> str:
+    # Plural and -ing folding only: "breeding" finds "Breeding", "pests" finds "pest"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    return [_stem(word) for word in tokenize(text, "en") if word not in QUERY_FILLER]
+
+
+class BM25Index:
+    def __init__(self, passages: List[Passage], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for doc, passage in enumerate(passages):
+            counts: Dict[str, int] = {}
+            for term in terms(f"{passage.title} {passage.text}"):
+                counts[term] = counts.get(term, 0) + 1
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((doc, count))
+        self._prepare()
+
+    def _prepare(self):
+        documents = len(self.passages)
+        self.average_length = sum(self.lengths) / documents if documents else 0.0
+        self.idf = {
+            term: math.log(1 + (documents - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+        # Terms the index has never seen are as informative as the rarest one
+        self.unseen_idf = math.log(1 + (documents + 0.5) / 0.5) if documents else 0.0
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[Passage, float]]:
+        scores: Dict[int, float] = {}
+        for term in set(terms(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, count in self.postings[term]:
+                norm = count + self.k1 * (1 - self.b + self.b * self.lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * count * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return [(self.passages[doc], score) for doc, score in best]
+
+    def coverage(self, query: str, passage: Passage) -> float:
+        """Share of the query's IDF weight found in ``passage`` (0-1)."""
+        query_terms = set(terms(query))
+        if not query_terms:
+            return 0.0
+        passage_terms = set(terms(f"{passage.title} {passage.text}"))
+        weights = {term: self.idf.get(term, self.unseen_idf) for term in query_terms}
+        total = sum(weights.values())
+        return sum(weight for term, weight in weights.items() if term in passage_terms) / total if total else 0.0
+
+    def matched_terms(self, query: str, passage: Passage) -> int:
+        """Number of distinct query terms found in ``passage``."""
+        return len(set(terms(query)) & set(terms(f"{passage.title} {passage.text}")))
+
+    def to_dict(self) -> dict:
+        return {
+            "passages": [asdict(passage) for passage in self.passages],
+            "postings": self.postings,
+            "lengths": self.lengths,
+            "k1": self.k1,
+            "b": self.b,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        index = cls.__new__(cls)
+        index.passages = [Passage(**passage) for passage in data["passages"]]
+        index.k1, index.b = data["k1"], data["b"]
+        index.postings = {term: [tuple(entry) for entry in posting] for term, posting in data["postings"].items()}
+        index.lengths = data["lengths"]
+        index._prepare()
+        return index
+
+
+def source_hash(pages_dir: str, tips: Dict[str, List[dict]]) -> str:
+    digest = hashlib.sha256(f"v{INDEX_VERSION}".encode())
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.html"))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps(tips, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_or_build(pages_dir: str, tips: Dict[str, List[dict]], index_path: Optional[str] = None) -> BM25Index:
+    """The persisted index if its sources are unchanged, otherwise a fresh build."""
+    current_hash = source_hash(pages_dir, tips)
+    if index_path and os.path.exists(index_path):
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("source_hash") == current_hash:
+                return BM25Index.from_dict(data["index"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable retrieval index {index_path}: {e}")
+
+    if not os.path.isdir(pages_dir):
+        logger.warning(f"Plant pages directory not found: {pages_dir}; indexing plant tips only")
+    index = BM25Index(load_plant_pages(pages_dir) + tip_passages(tips))
+    logger.info(f"Built retrieval index with {len(index.passages)} passages")
+
+    if index_path:
+        try:
+            tmp_path = f"{index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"source_hash": current_hash, "index": index.to_dict()}, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.warning(f"Could not persist retrieval index to {index_path}: {e}")
+    return index
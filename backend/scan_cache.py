@@ -0,0 +1,132 @@
+"""
+Persistent, content-addressed cache of disease detection results.
+
+Entries are keyed by a hash of the normalized image, prefixed with a
+namespace that changes with the prompt, model and response schema, so a
+verdict is only reused while it would still be produced the same way.
+They live in the main SQLite database. Expired entries are dropped on read. A hit only writes its
+access time back when the stored one is older than ``touch_interval``, so
+repeat hits stay reads; the hits counted in between are written with it.
+Every ``evict_every`` stores, expired rows are purged and, once the table has
+grown past ``max_entries``, the least recently used rows are evicted.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(image) -> str:
+    """Hash a normalized PIL image by its size, mode and raw pixels."""
+    digest = hashlib.sha256(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def cache_namespace(*parts) -> str:
+    """Short hash of whatever determines a verdict (prompt, model, schema, ...)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class ScanResultCache:
+    def __init__(
+        self,
+        session_factory,
+        model,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 10000,
+        touch_interval: float = 600,
+        evict_every: int = 100,
+        namespace: str = "",
+    ):
+        self.session_factory = session_factory
+        self.namespace = namespace
+        self.model = model
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.touch_interval = timedelta(seconds=touch_interval)
+        self.evict_every = evict_every
+
+        self._lock = threading.Lock()
+        self._pending_hits = Counter()
+        self._puts = 0
+
+    def key(self, image_hash: str) -> str:
+        return f"{self.namespace}:{image_hash}" if self.namespace else image_hash
+
+    def get(self, image_hash: str) -> Optional[dict]:
+        image_hash = self.key(image_hash)
+        db = self.session_factory()
+        try:
+            entry = db.get(self.model, image_hash)
+            if entry is None:
+                return None
+
+            now = datetime.utcnow()
+            if now - entry.created_at > self.ttl:
+                db.delete(entry)
+                db.commit()
+                return None
+
+            with self._lock:
+                self._pending_hits[image_hash] += 1
+                touch = now - entry.last_accessed_at >= self.touch_interval
+                hits = self._pending_hits.pop(image_hash) if touch else 0
+            if touch:
+                model = self.model
+                db.execute(
+                    update(model)
+                    .where(model.image_hash == image_hash)
+                    .values(last_accessed_at=now, hits=func.coalesce(model.hits, 0) + hits)
+                )
+                db.commit()
+            return json.loads(entry.result)
+        except Exception as e:
+            logger.warning(f"Scan cache lookup failed: {e}")
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def put(self, image_hash: str, result: dict):
+        image_hash = self.key(image_hash)
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            db.merge(self.model(
+                image_hash=image_hash,
+                result=json.dumps(result),
+                hits=0,
+                created_at=now,
+                last_accessed_at=now,
+            ))
+            with self._lock:
+                self._pending_hits.pop(image_hash, None)
+                self._puts += 1
+                evict = self._puts % self.evict_every == 0
+            if evict:
+                db.flush()
+                self._evict(db, now)
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Scan cache store failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def _evict(self, db, now: datetime):
+        model = self.model
+        db.execute(delete(model).where(model.created_at < now - self.ttl), execution_options={"synchronize_session": False})
+
+        excess = db.scalar(select(func.count()).select_from(model)) - self.max_entries
+        if excess > 0:
+            oldest = select(model.image_hash).order_by(model.last_accessed_at.asc()).limit(excess)
+            db.execute(delete(model).where(model.image_hash.in_(oldest)), execution_options={"synchronize_session": False})
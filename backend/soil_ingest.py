@@ -0,0 +1,197 @@
+"""
+Bulk ingestion of soil sensor readings.
+
+Accepts either NDJSON (one reading per line, parsed incrementally as the
+request body streams in) or a columnar JSON batch, checks farm ownership
+once per farm per batch and writes every accepted reading with a single
+executemany in one transaction.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, select
+
+SOIL_FIELDS = ("ph_level", "moisture", "temperature", "nitrogen", "phosphorus", "potassium")
+REQUIRED_FIELDS = ("ph_level", "moisture", "temperature")
+
+# (farm_id, recorded_at, ph_level, moisture, temperature, nitrogen, phosphorus, potassium)
+ReadingRow = Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class IngestError(ValueError):
+    pass
+
+
+def _parse_timestamp(value, default: datetime) -> datetime:
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        try:
+            return _EPOCH + timedelta(seconds=value)
+        except OverflowError:
+            # Both parsers turn ValueError into IngestError
+            raise ValueError(f"recorded_at {value} is out of range")
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+
+def _row_from_record(record: dict, now: datetime) -> ReadingRow:
+    # float(None) and a missing key both raise, so required fields need no separate check
+    recorded_at = record.get("recorded_at")
+    return (
+        int(record["farm_id"]),
+        now if recorded_at is None else _parse_timestamp(recorded_at, now),
+        float(record["ph_level"]),
+        float(record["moisture"]),
+        float(record["temperature"]),
+        _optional_float(record.get("nitrogen")),
+        _optional_float(record.get("phosphorus")),
+        _optional_float(record.get("potassium")),
+    )
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes], max_rows: int) -> List[ReadingRow]:
+    """Parse readings line by line as body chunks arrive."""
+    now = datetime.utcnow()
+    rows: List[ReadingRow] = []
+    pending = b""
+    line_number = 0
+
+    def consume(line: bytes):
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        if len(rows) >= max_rows:
+            raise IngestError(f"batch exceeds {max_rows} readings")
+        try:
+            rows.append(_row_from_record(json.loads(line), now))
+        except (KeyError, TypeError, ValueError) as e:
+            raise IngestError(f"line {line_number}: invalid or missing field ({e})")
+
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            consume(line)
+    consume(pending)
+    return rows
+
+
+def parse_columnar(payload: dict, max_rows: int) -> List[ReadingRow]:
+    """Parse ``{"farm_id": [...], "ph_level": [...], ...}``.
+
+    Every column is a list of the same length, except ``farm_id``, which may
+    be a single id for the whole batch. Optional columns may be omitted.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("ph_level"), list):
+        raise IngestError("expected a columnar object with list-valued fields")
+
+    count = len(payload["ph_level"])
+    if count > max_rows:
+        raise IngestError(f"batch exceeds {max_rows} readings")
+
+    def column(name: str, required: bool = False) -> Sequence:
+        values = payload.get(name)
+        if values is None:
+            if required:
+                raise IngestError(f"missing column {name}")
+            return [None] * count
+        if not isinstance(values, list):
+            if name == "farm_id":
+                return [values] * count
+            raise IngestError(f"column {name} must be a list")
+        if len(values) != count:
+            raise IngestError(f"column {name} has {len(values)} values, expected {count}")
+        return values
+
+    now = datetime.utcnow()
+    farm_ids = column("farm_id", required=True)
+    recorded = column("recorded_at")
+    ph, moisture, temperature = (column(name, required=True) for name in REQUIRED_FIELDS)
+    nitrogen, phosphorus, potassium = column("nitrogen"), column("phosphorus"), column("potassium")
+
+    try:
+        return [
+            (
+                int(farm_ids[i]),
+                _parse_timestamp(recorded[i], now),
+                float(ph[i]),
+                float(moisture[i]),
+                float(temperature[i]),
+                _optional_float(nitrogen[i]),
+                _optional_float(phosphorus[i]),
+                _optional_float(potassium[i]),
+            )
+            for i in range(count)
+        ]
+    except (TypeError, ValueError) as e:
+        raise IngestError(str(e))
+
+
+def _executemany(conn, readings_table, rows: List[ReadingRow]):
+    """Hand the tuples straight to the driver's executemany.
+
+    Going through the ORM or Core per-row dict handling costs more than the
+    insert itself at these volumes, so the statement is compiled once for the
+    active dialect and only the timestamp column is converted.
+    """
+    columns = ("farm_id", "recorded_at") + SOIL_FIELDS
+    stmt = readings_table.insert().values({name: bindparam(name) for name in columns})
+    compiled = stmt.compile(dialect=conn.dialect)
+
+    to_db = readings_table.c.recorded_at.type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+    if to_db is not None:
+        rows = [(row[0], to_db(row[1])) + row[2:] for row in rows]
+
+    if compiled.positional:
+        order = [columns.index(name) for name in compiled.positiontup]
+        params = [tuple(row[i] for i in order) for row in rows]
+    else:
+        params = [dict(zip(columns, row)) for row in rows]
+    conn.exec_driver_sql(str(compiled), params)
+
+
+def insert_readings(
+    engine,
+    readings_table,
+    farms_table,
+    owner_id: int,
+    rows: List[ReadingRow],
+    on_insert: Optional[Callable] = None,
+) -> Dict:
+    """Insert rows for farms the owner holds, in one transaction. Returns counts.
+
+    ``on_insert(rows)`` is called with the accepted rows once the transaction
+    has committed.
+    """
+    farm_ids = {row[0] for row in rows}
+    with engine.begin() as conn:
+        # One ownership query for every farm in the batch
+        owned = set(conn.scalars(
+            select(farms_table.c.id).where(farms_table.c.owner_id == owner_id, farms_table.c.id.in_(farm_ids))
+        )) if farm_ids else set()
+
+        accepted = [row for row in rows if row[0] in owned]
+        if accepted:
+            _executemany(conn, readings_table, accepted)
+    if accepted and on_insert is not None:
+        on_insert(accepted)
+
+    rejected_farms = sorted(farm_ids - owned)
+    return {
+        "inserted": len(accepted),
+        "rejected": len(rows) - len(accepted),
+        "farms": len(owned),
+        "rejected_farm_ids": rejected_farms,
+    }
@@ -0,0 +1,281 @@
+"""
+Hourly and daily rollups of soil readings.
+
+Each rollup row holds min/max/sum/count of one metric for one farm and time
+bucket. The statistics merge associatively, so newly inserted readings are
+handed to ``RollupWriter`` after their transaction commits and folded in by
+a background task, in one upsert transaction every ``flush_interval``
+seconds, keeping the rollup writes off the ingest path. A rebuild is the
+same NumPy aggregation run over the readings table, one farm per
+transaction, so it never holds the write lock for more than one farm.
+
+Folding and a farm's rebuild take the same lock. Once the rebuild's delete
+holds the database write lock, the farm's queued readings are already
+committed and part of the rebuild, so they are dropped from the queue
+instead of being counted twice.
+
+Every rebuilt farm gets a row in the backfill table. At startup the farms
+with readings but no such row are rebuilt in the background, so a backfill
+interrupted by a shutdown carries on where it stopped. Readings accepted
+but not yet folded when the process dies are missing from the rollups until
+the farm is rebuilt.
+"""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from soil_ingest import SOIL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS: Dict[str, int] = {"hour": 3600, "day": 86400}
+
+_EPOCH = datetime(1970, 1, 1)
+
+ROLLUP_COLUMNS = ("farm_id", "resolution", "bucket_start", "metric", "min_value", "max_value", "sum_value", "count")
+
+
+def aggregate(farm_ids: np.ndarray, epoch_seconds: np.ndarray, values: np.ndarray, resolution: str) -> List[tuple]:
+    """Group readings by (farm, bucket) and reduce every metric column.
+
+    ``values`` is an (n, len(SOIL_FIELDS)) float array with NaN for missing
+    measurements. Returns tuples in ROLLUP_COLUMNS order.
+    """
+    if len(farm_ids) == 0:
+        return []
+
+    seconds = RESOLUTIONS[resolution]
+    buckets = epoch_seconds // seconds * seconds
+
+    order = np.lexsort((buckets, farm_ids))
+    farm_ids, buckets, values = farm_ids[order], buckets[order], values[order]
+
+    change = (np.diff(farm_ids) != 0) | (np.diff(buckets) != 0)
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+
+    group_farms = farm_ids[starts].tolist()
+    bucket_times = [_EPOCH + timedelta(seconds=bucket) for bucket in buckets[starts].tolist()]
+
+    rows = []
+    for column, metric in enumerate(SOIL_FIELDS):
+        series = values[:, column]
+        present = ~np.isnan(series)
+        counts = np.add.reduceat(present.astype(np.int64), starts)
+        groups = np.flatnonzero(counts)
+        if len(groups) == 0:
+            continue
+        sums = np.add.reduceat(np.where(present, series, 0.0), starts)[groups].tolist()
+        minimums = np.minimum.reduceat(np.where(present, series, np.inf), starts)[groups].tolist()
+        maximums = np.maximum.reduceat(np.where(present, series, -np.inf), starts)[groups].tolist()
+
+        rows.extend(zip(
+            (group_farms[group] for group in groups.tolist()),
+            [resolution] * len(groups),
+            (bucket_times[group] for group in groups.tolist()),
+            [metric] * len(groups),
+            minimums,
+            maximums,
+            sums,
+            counts[groups].tolist(),
+        ))
+    return rows
+
+
+def _to_arrays(rows: Sequence[Sequence]):
+    """Split (farm_id, recorded_at, *SOIL_FIELDS) tuples into NumPy columns."""
+    farm_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    second = timedelta(seconds=1)
+    timestamps = np.fromiter(((row[1] - _EPOCH) // second for row in rows), dtype=np.int64, count=len(rows))
+    values = np.array([row[2:] for row in rows], dtype=np.float64)  # None becomes NaN
+    return farm_ids, timestamps, values
+
+
+def _upsert(conn, rollup_table, rows: List[tuple]):
+    if not rows:
+        return
+
+    if conn.dialect.name == "postgresql":
+        stmt = postgresql.insert(rollup_table)
+        least, greatest = func.least, func.greatest
+    else:
+        stmt = sqlite.insert(rollup_table)
+        least, greatest = func.min, func.max  # two-argument scalar min/max
+
+    stmt = stmt.values({name: bindparam(name) for name in ROLLUP_COLUMNS})
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["farm_id", "resolution", "bucket_start", "metric"],
+        set_={
+            "min_value": least(rollup_table.c.min_value, excluded.min_value),
+            "max_value": greatest(rollup_table.c.max_value, excluded.max_value),
+            "sum_value": rollup_table.c.sum_value + excluded.sum_value,
+            "count": rollup_table.c.count + excluded.count,
+        },
+    )
+
+    # Straight to the driver's executemany, as in soil_ingest
+    compiled = stmt.compile(dialect=conn.dialect)
+    to_db = rollup_table.c.bucket_start.type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+    if to_db is not None:
+        rows = [row[:2] + (to_db(row[2]),) + row[3:] for row in rows]
+    if compiled.positional:
+        order = [ROLLUP_COLUMNS.index(name) for name in compiled.positiontup]
+        params = [tuple(row[i] for i in order) for row in rows]
+    else:
+        params = [dict(zip(ROLLUP_COLUMNS, row)) for row in rows]
+    conn.exec_driver_sql(str(compiled), params)
+
+
+def apply_readings(conn, rollup_table, rows: Sequence[Sequence]):
+    """Fold newly inserted readings into the rollups, inside the caller's transaction."""
+    if not rows:
+        return
+    farm_ids, timestamps, values = _to_arrays(rows)
+    for resolution in RESOLUTIONS:
+        _upsert(conn, rollup_table, aggregate(farm_ids, timestamps, values, resolution))
+
+
+def rebuild_farm(conn, readings_table, rollup_table, farm_id: int, chunk_size: int = 200000) -> int:
+    """Recompute one farm's rollups from its raw readings, in the caller's transaction."""
+    columns = [readings_table.c.farm_id, readings_table.c.recorded_at] + [readings_table.c[name] for name in SOIL_FIELDS]
+    stmt = select(*columns).where(readings_table.c.farm_id == farm_id)
+    total = 0
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+    for chunk in result.partitions():
+        apply_readings(conn, rollup_table, chunk)
+        total += len(chunk)
+    return total
+
+
+class RollupWriter:
+    """Folds committed readings into the rollups in the background and rebuilds farms."""
+
+    def __init__(self, engine, readings_table, rollup_table, backfill_table, flush_interval: float = 1.0):
+        self.engine = engine
+        self.readings_table = readings_table
+        self.rollup_table = rollup_table
+        self.backfill_table = backfill_table
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()  # guards _pending
+        self._fold_lock = threading.Lock()  # one fold or farm rebuild at a time
+        self._pending: List[Sequence] = []
+        self._task: Optional[asyncio.Task] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._backfill_stop = threading.Event()
+
+    def add(self, rows: Sequence[Sequence]):
+        """Queue (farm_id, recorded_at, *SOIL_FIELDS) rows of committed readings.
+        Safe to call from worker threads."""
+        with self._lock:
+            self._pending.extend(rows)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the backfill after its current farm, then fold what is still queued."""
+        self._backfill_stop.set()
+        if self._backfill_task is not None:
+            await asyncio.gather(self._backfill_task, return_exceptions=True)
+            self._backfill_task = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Soil rollup flush failed: {e}")
+
+    async def flush(self):
+        await asyncio.to_thread(self._fold)
+
+    def _fold(self):
+        with self._fold_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                with self.engine.begin() as conn:
+                    apply_readings(conn, self.rollup_table, rows)
+            except Exception:
+                # Keep the readings for the next flush
+                with self._lock:
+                    self._pending[:0] = rows
+                raise
+
+    # Rebuilds
+
+    async def rebuild(self, farm_id: int) -> int:
+        return await asyncio.to_thread(self._rebuild_farm, farm_id)
+
+    def _rebuild_farm(self, farm_id: int) -> int:
+        backfill = self.backfill_table
+        with self._fold_lock, self.engine.begin() as conn:
+            conn.execute(delete(self.rollup_table).where(self.rollup_table.c.farm_id == farm_id))
+            # The delete holds the write lock, so every queued reading of this farm
+            # is committed and will be read below
+            with self._lock:
+                self._pending = [row for row in self._pending if row[0] != farm_id]
+            total = rebuild_farm(conn, self.readings_table, self.rollup_table, farm_id)
+            conn.execute(delete(backfill).where(backfill.c.farm_id == farm_id))
+            conn.execute(backfill.insert().values(farm_id=farm_id, completed_at=datetime.utcnow()))
+        return total
+
+    def _farms_to_backfill(self) -> List[int]:
+        readings, backfill = self.readings_table, self.backfill_table
+        with self.engine.connect() as conn:
+            return list(conn.scalars(
+                select(readings.c.farm_id).distinct()
+                .where(readings.c.farm_id.not_in(select(backfill.c.farm_id)))
+            ))
+
+    def _backfill(self) -> int:
+        farm_ids = self._farms_to_backfill()
+        total = 0
+        for farm_id in farm_ids:
+            if self._backfill_stop.is_set():
+                logger.info(f"Soil rollup backfill stopped after {total} readings; it resumes on the next start")
+                return total
+            total += self._rebuild_farm(farm_id)
+        if farm_ids:
+            logger.info(f"Backfilled soil rollups for {len(farm_ids)} farms from {total} readings")
+        return total
+
+    def start_backfill(self):
+        """Rebuild, in the background, every farm with readings that was never rebuilt."""
+        self._backfill_stop.clear()
+        self._backfill_task = asyncio.create_task(asyncio.to_thread(self._backfill))
+        self._backfill_task.add_done_callback(self._on_backfill_done)
+
+    def _on_backfill_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Soil rollup backfill failed: {task.exception()!r}")
+
+
+def summarize(rows: Iterable) -> List[dict]:
+    """Pivot rollup rows (ordered by bucket) into one entry per bucket."""
+    buckets: Dict[datetime, dict] = {}
+    for row in rows:
+        entry = buckets.setdefault(row.bucket_start, {"bucket_start": row.bucket_start})
+        entry[row.metric] = {
+            "min": row.min_value,
+            "max": row.max_value,
+            "mean": row.sum_value / row.count,
+            "count": row.count,
+        }
+    return list(buckets.values())
@@ -0,0 +1,54 @@
+"""
+Chunked ingest of uploaded images into the uploads directory.
+
+Uploads are copied to disk a chunk at a time with the size limit enforced
+as bytes arrive, so a large camera photo is never held in memory whole.
+"""
+
+import hashlib
+import os
+import secrets
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SavedUpload:
+    path: str
+    size: int
+    md5: str  # digest of the raw upload bytes
+
+
+async def save_upload(file: UploadFile, upload_dir: str, max_bytes: int) -> SavedUpload:
+    os.makedirs(upload_dir, exist_ok=True)
+
+    # Unique per upload so concurrent uploads of "image.jpg" never collide
+    filename = os.path.basename(file.filename or "upload")
+    file_path = f"{upload_dir}/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}_{filename}"
+
+    size = 0
+    digest = hashlib.md5()
+    try:
+        with open(file_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        os.remove(file_path)
+        raise
+
+    return SavedUpload(path=file_path, size=size, md5=digest.hexdigest())
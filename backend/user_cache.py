@@ -0,0 +1,92 @@
+"""
+In-process cache of authenticated users.
+
+``get_current_user`` runs on every authenticated request, so the user row it
+needs is kept here as an immutable snapshot keyed by user id, bounded by a
+short TTL and an LRU size limit. ORM updates and deletes of a user evict the
+entry straight away; the TTL bounds staleness for changes made elsewhere
+(another worker process or a bulk UPDATE).
+
+Access tokens carry no profile data, only ``sub``, ``role`` and a claims
+format version ``ver``. In claims-only mode a request whose user is not
+cached is served from those claims alone; the profile fields are then None
+and are resolved from this cache (or the database) where a route needs them.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+
+# Bumped when the claims change; tokens of another version are looked up instead
+CLAIMS_VERSION = 2
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The attributes of a User that request handlers read."""
+    id: int
+    email: Optional[str] = None
+    username: Optional[str] = None
+    role: Optional[str] = None
+    region: Optional[str] = None
+    crops_grown: Optional[str] = None  # JSON string, as stored
+    language: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_model(cls, user) -> "CachedUser":
+        return cls(**{field.name: getattr(user, field.name) for field in fields(cls)})
+
+    @classmethod
+    def from_claims(cls, user_id: int, claims: dict) -> Optional["CachedUser"]:
+        """Id and role from token claims, without profile fields; None for
+        tokens of another claims version."""
+        if claims.get("ver") != CLAIMS_VERSION or "role" not in claims:
+            return None
+        return cls(id=user_id, role=claims["role"])
+
+    @property
+    def has_profile(self) -> bool:
+        return self.email is not None
+
+    def claims(self) -> dict:
+        return {"role": self.role, "ver": CLAIMS_VERSION}
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (expires_at, CachedUser)
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._entries.pop(user_id, None)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user) -> CachedUser:
+        snapshot = user if isinstance(user, CachedUser) else CachedUser.from_model(user)
+        self._entries[snapshot.id] = (time.monotonic() + self.ttl, snapshot)
+        self._entries.move_to_end(snapshot.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def watch(self, model):
+        """Evict a user whenever the ORM flushes an update or delete of it."""
+        @event.listens_for(model, "after_update")
+        @event.listens_for(model, "after_delete")
+        def evict_user(mapper, connection, target):
+            self.invalidate(target.id)
+
@@ -0,0 +1,239 @@
+"""
+Async OpenWeatherMap client with a shared connection pool and a TTL cache.
+
+Nearby coordinates are bucketed into geohash cells so farms that sit next to
+each other share one cache entry (and one pair of upstream calls).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 5) -> str:
+    """Encode a coordinate as a geohash string of the given precision."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_center(cell: str) -> Tuple[float, float]:
+    """Return the (lat, lng) center of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        bits = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+@dataclass
+class _CacheEntry:
+    data: dict
+    fetched_at: float
+
+
+class WeatherClient:
+    """Fetches current weather + forecast in parallel and caches per geohash cell.
+
+    Entries are fresh for ``ttl`` seconds. For a further ``stale_ttl`` seconds a
+    request is answered from the old entry while a single background refresh
+    revalidates it.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.openweathermap.org/data/2.5",
+        ttl: float = 600,
+        stale_ttl: float = 1800,
+        timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        precision: int = 5,
+        max_entries: int = 5000,
+        max_connections: int = 20,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.precision = precision
+        self.max_entries = max_entries
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: Dict[str, _CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._upstream_errors = 0
+        self._upstream_calls = 0
+        self._upstream_latency_total = 0.0
+        self._upstream_latencies = deque(maxlen=512)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, lat: float, lng: float) -> dict:
+        cell = geohash_encode(lat, lng, self.precision)
+        entry = self._cache.get(cell)
+        now = time.monotonic()
+
+        if entry is not None:
+            age = now - entry.fetched_at
+            if age < self.ttl:
+                self._hits += 1
+                return entry.data
+            if age < self.ttl + self.stale_ttl:
+                # Serve stale and revalidate in the background
+                self._stale_hits += 1
+                self._refresh(cell)
+                return entry.data
+
+        self._misses += 1
+        # Shielded: a caller that disconnects must not cancel the fetch other requests joined
+        return await asyncio.shield(self._refresh(cell))
+
+    def _refresh(self, cell: str) -> asyncio.Task:
+        """Start (or join) the single in-flight upstream fetch for a cell."""
+        task = self._inflight.get(cell)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(cell))
+            self._inflight[cell] = task
+            task.add_done_callback(lambda t: self._on_refresh_done(cell, t))
+        return task
+
+    def _on_refresh_done(self, cell: str, task: asyncio.Task):
+        self._inflight.pop(cell, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Weather refresh failed for cell {cell}: {task.exception()}")
+
+    async def _fetch_and_store(self, cell: str) -> dict:
+        lat, lng = geohash_center(cell)
+        data = await self._fetch(lat, lng)
+        if len(self._cache) >= self.max_entries and cell not in self._cache:
+            oldest = min(self._cache, key=lambda key: self._cache[key].fetched_at)
+            del self._cache[oldest]
+        self._cache[cell] = _CacheEntry(data=data, fetched_at=time.monotonic())
+        return data
+
+    async def _fetch(self, lat: float, lng: float) -> dict:
+        client = self._get_client()
+        params = {"lat": lat, "lon": lng, "appid": self.api_key, "units": "metric"}
+
+        started = time.perf_counter()
+        self._upstream_calls += 1
+        try:
+            current_response, forecast_response = await asyncio.gather(
+                client.get("/weather", params=params),
+                client.get("/forecast", params=params),
+            )
+            current_response.raise_for_status()
+            forecast_response.raise_for_status()
+        except Exception:
+            self._upstream_errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._upstream_latency_total += elapsed
+            self._upstream_latencies.append(elapsed)
+
+        return self._build_payload(current_response.json(), forecast_response.json())
+
+    @staticmethod
+    def _build_payload(data: dict, forecast_data: dict) -> dict:
+        forecast = []
+        for item in forecast_data["list"][:3]:  # Next 3 days
+            forecast.append({
+                "day": item["dt_txt"].split(" ")[0],
+                "temp": item["main"]["temp"],
+                "rain": item.get("rain", {}).get("3h", 0),
+                "description": item["weather"][0]["description"]
+            })
+
+        return {
+            "temperature": data["main"]["temp"],
+            "humidity": data["main"]["humidity"],
+            "pressure": data["main"]["pressure"],
+            "wind_speed": data["wind"]["speed"],
+            "description": data["weather"][0]["description"],
+            "rain": data.get("rain", {}).get("1h", 0),
+            "forecast": forecast,
+            "alerts": []  # Add weather alerts based on conditions
+        }
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._stale_hits + self._misses
+        latencies = sorted(self._upstream_latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 1)
+
+        return {
+            "cache_entries": len(self._cache),
+            "lookups": lookups,
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "hit_ratio": round((self._hits + self._stale_hits) / lookups, 4) if lookups else None,
+            "upstream_calls": self._upstream_calls,
+            "upstream_errors": self._upstream_errors,
+            "upstream_latency_ms": {
+                "mean": round(self._upstream_latency_total / self._upstream_calls * 1000, 1) if self._upstream_calls else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "geohash_precision": self.precision,
+        }
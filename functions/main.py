@@ -3,6 +3,15 @@ from flask import jsonify, request
 import google.generativeai as genai
 import os
 
+from disease_verdict import DISEASE_PROMPT, DISEASE_RESPONSE_SCHEMA, parse_disease_verdict
+
+DISEASE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": DISEASE_RESPONSE_SCHEMA,
+    "max_output_tokens": 256,
+    "temperature": 0.2,
+}
+
 
 def get_gemini_model():
     """Return a configured Gemini model or raise if the API key is missing."""
@@ -29,53 +38,13 @@ def disease_detection(request):
         # Initialize Gemini model
         model = get_gemini_model()
         
-        # Analyze the image for disease detection
-        prompt = """
-        Analyze this agricultural crop image and provide:
-        1. Disease status (healthy/diseased)
-        2. If diseased, identify the specific disease name
-        3. Confidence percentage
-        4. Treatment recommendations
-        
-        Focus on common crop diseases like blight, rust, powdery mildew, bacterial spots, etc.
-        Provide practical, farmer-friendly advice.
-        """
-        
-        response = model.generate_content([prompt, image_data['image']])
-        
-        # Parse response
-        response_text = response.text
-        lines = response_text.split('\n')
+        # Analyze the image for disease detection; Gemini answers in schema-checked JSON
+        response = model.generate_content(
+            [DISEASE_PROMPT, image_data['image']],
+            generation_config=DISEASE_GENERATION_CONFIG
+        )
         
-        status = "healthy"
-        disease = None
-        confidence = "0%"
-        recommendation = "No specific treatment needed."
-        
-        for line in lines:
-            line_lower = line.lower()
-            if "diseased" in line_lower or "disease" in line_lower:
-                status = "diseased"
-            if "confidence" in line_lower or "%" in line:
-                import re
-                confidence_match = re.search(r'(\d+)%', line)
-                if confidence_match:
-                    confidence = confidence_match.group(1) + "%"
-            if "treatment" in line_lower or "recommend" in line_lower:
-                recommendation = line.strip()
-        
-        if status == "diseased":
-            for line in lines:
-                if any(disease_name in line_lower for disease_name in ["blight", "rust", "mildew", "spot", "rot", "wilt"]):
-                    disease = line.strip()
-                    break
-        
-        return jsonify({
-            "status": status,
-            "disease": disease,
-            "confidence": confidence,
-            "recommendation": recommendation
-        })
+        return jsonify(parse_disease_verdict(response.text))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -73,6 +73,58 @@ def test_gemini_integration():
         print(f"❌ Gemini API connection failed: {e}")
         return False
 
+def test_soil_pagination():
+    """Page through bulk-ingested soil readings one at a time"""
+    print("🧪 Testing Soil Reading Pagination...")
+    
+    base_url = "http://localhost:8000"
+    email = f"pagination-{int(time.time())}@example.com"
+    
+    try:
+        requests.post(f"{base_url}/api/auth/register", json={
+            "email": email, "username": email.split("@")[0], "password": "pagination-test"
+        }, timeout=10)
+        token = requests.post(f"{base_url}/api/auth/login", json={
+            "email": email, "password": "pagination-test"
+        }, timeout=10).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        
+        farm = requests.post(f"{base_url}/api/farms", json={
+            "name": "Pagination test", "crop_type": "rice", "location_lat": 7.0, "location_lng": 80.0
+        }, headers=headers, timeout=10).json()
+        
+        # Whole-second timestamps, some shared, as sensors often report them
+        readings = 25
+        batch = {
+            "farm_id": farm["id"],
+            "recorded_at": [f"2024-01-01T00:00:{second // 2:02d}" for second in range(readings)],
+            "ph_level": [6.5] * readings,
+            "moisture": [40.0] * readings,
+            "temperature": [25.0] * readings,
+        }
+        requests.post(f"{base_url}/api/soil-readings/bulk", data=json.dumps(batch),
+                      headers={**headers, "Content-Type": "application/json"}, timeout=10).raise_for_status()
+        
+        seen = []
+        cursor = None
+        for _ in range(readings + 1):
+            params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+            page = requests.get(f"{base_url}/api/soil-readings/{farm['id']}", params=params,
+                                headers=headers, timeout=10).json()
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        
+        if len(seen) == readings and len(set(seen)) == readings:
+            print(f"✅ Paged through all {readings} ingested readings without repeats")
+            return True
+        print(f"❌ Expected {readings} distinct readings, got {len(seen)} ({len(set(seen))} distinct)")
+        return False
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        print(f"❌ Soil pagination check failed: {e}")
+        return False
+
 def check_images():
     """Check if all crop images are present"""
     print("🧪 Checking Crop Images...")
@@ -97,6 +149,22 @@ def check_images():
         print("✅ All crop images present")
         return True
 
+def check_shared_modules():
+    """Check that the Cloud Function's copy of the disease verdict module matches the backend's"""
+    print("🧪 Checking Shared Modules...")
+    
+    with open("backend/disease_verdict.py", encoding="utf-8") as f:
+        backend_copy = f.read()
+    with open("functions/disease_verdict.py", encoding="utf-8") as f:
+        function_copy = f.read()
+    
+    if backend_copy != function_copy:
+        print("❌ functions/disease_verdict.py differs from backend/disease_verdict.py")
+        return False
+    else:
+        print("✅ Disease verdict module in sync")
+        return True
+
 def main():
     """Run all tests"""
     print("🚀 Plantation Management System - Test Suite")
@@ -104,9 +172,11 @@ def main():
     
     tests = [
         ("Crop Images", check_images),
+        ("Shared Modules", check_shared_modules),
         ("Backend API", test_backend),
         ("Frontend", test_frontend),
-        ("Gemini Integration", test_gemini_integration)
+        ("Gemini Integration", test_gemini_integration),
+        ("Soil Pagination", test_soil_pagination)
     ]
     
     results = []